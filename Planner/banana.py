@@ -49,10 +49,10 @@ eat        = Action("Eat",
 actions = [go_to, take, drop, climb_up, climb_down, eat]
 
 
-if __name__ == "__main__":
-
-	from test import *
-
+def create_problem():
+	"""Create the initial Beliefs, with Monkey, Banana and Crate in different
+	Rooms, and the goal of Monkey being happy. Returns the Beliefs and the goal.
+	"""
 	# abbreviations for objects
 	M, B, C, R1, R2, R3 = "Monkey", "Banana", "Crate", "Room 1", "Room 2", "Room 3"
 
@@ -63,6 +63,15 @@ if __name__ == "__main__":
 		Room(R1), Room(R2), Room(R3),
 		At(M, R1), At(B, R2), At(C, R3)
 	)
+	return (beliefs, And(Happy(M), At(M, R1)))
+
+
+if __name__ == "__main__":
+
+	from test import *
+
+	# create initial beliefs
+	(beliefs, goal) = create_problem()
 	print_all("Initial Beliefs", beliefs)
 	
 	# Monkey wants Banana. Plan length 9
@@ -70,7 +79,6 @@ if __name__ == "__main__":
 	# Serial Decomposition: 1775 steps, w/ pruning 259
 	# Breadth-First Search:    ? steps, w/ pruning  30
 	# SD-Breadth-First Search: ? steps, w/ pruning  23
-	goal = And(Happy(M), At(M, R1))
 	plan = search_plan(goal, beliefs, actions, False, True)
 	if plan != None:
 		print_all("Plan sequence for goal %s" % goal, [ (a.name, m) for (a, m) in plan])
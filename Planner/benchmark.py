@@ -0,0 +1,227 @@
+"""Planner Benchmark.
+
+Runs search_plan with all combinations of planning options (serial
+decomposition, search strategy, grounding) on the bundled example domains, as
+well as the deduction on the family example, and records wall time, planning
+steps, generated successors, pruned branches, fringe size, peak memory and plan
+length for each run, as well as the time per search phase and the successors
+per action, as collected by SearchStats. Results can be written as JSON or CSV,
+so that different revisions can be compared.
+
+Each run is done in a separate process, so that runs can be aborted after a
+timeout, and the memory used by one run does not distort the next.
+"""
+
+import csv
+import json
+import multiprocessing
+import optparse
+from queue import Empty
+import resource
+import sys
+import time
+
+from knowledge import *
+from reasoning import *
+import planning
+
+import hanoi, blocksworld, banana, boating, family, repair
+
+STRATEGIES = ["ids", "idastar", "bfs", "astar", "wastar", "gbfs", "beam", "bidirectional"]
+FIELDS = ["domain", "problem", "serial_decomp", "strategy", "ground", "status",
+          "time", "steps", "generated", "pruned", "fringe", "length", "memory"]
+
+
+################################################################################
+#                                                                              #
+#   PROBLEMS                                                                   #
+#                                                                              #
+################################################################################
+
+def problems(max_blocks):
+	"""Get all the planning problems as tuples of domain and problem name,
+	goal, beliefs and actions, as created by the domain modules.
+	"""
+	result = []
+	for n in range(2, max_blocks + 1):
+		(objects, goal) = hanoi.create_problem(n)
+		beliefs = deduce(create_beliefs(*objects), *hanoi.rules)
+		result += [ ("hanoi", str(n), goal, beliefs, hanoi.actions) ]
+	(objects, goals) = blocksworld.create_problem()
+	beliefs = deduce(create_beliefs(*objects), *blocksworld.rules)
+	result += [ ("blocksworld", name, goal, beliefs, blocksworld.actions)
+	            for (name, goal) in goals ]
+	for domain in (banana, boating, repair):
+		(beliefs, goal) = domain.create_problem()
+		result += [ (domain.__name__, domain.__name__, goal, beliefs, domain.actions) ]
+	return result
+
+
+
+################################################################################
+#                                                                              #
+#   RUNNING BENCHMARKS                                                         #
+#                                                                              #
+################################################################################
+
+def configurations(strategies=STRATEGIES):
+	"""Get all combinations of planning options, as dictionaries."""
+	return [ dict(serial_decomp=serial_decomp, strategy=strategy, ground=ground)
+	         for ground in (False, True)
+	         for serial_decomp in (False, True)
+	         for strategy in strategies ]
+
+
+def run_plan(goal, beliefs, actions, config):
+	"""Run search_plan with the given configuration and return the results as
+	a dictionary.
+	"""
+	planning.LOG_LEVEL = 0
+	stats = planning.SearchStats()
+	start = time.time()
+	try:
+		plan = planning.search_plan(goal, beliefs, actions, stats=stats, **config)
+		status = "ok" if plan is not None else "no plan"
+	except ValueError as e:
+		plan, status = None, "error: %s" % e
+	return dict(status=status, time=time.time() - start,
+	            steps=stats.expanded, pruned=stats.pruned,
+	            generated=stats.generated, fringe=stats.max_fringe,
+	            times=dict(stats.times), actions=dict(stats.actions),
+	            length=len(plan) if plan is not None else None)
+
+
+def run_deduce(beliefs, rules, config):
+	"""Run deduce with the given configuration and return the results as a
+	dictionary; the number of beliefs is reported as length.
+	"""
+	start = time.time()
+	beliefs = deduce(beliefs, *rules, **config)
+	return dict(status="ok", time=time.time() - start, steps=None, pruned=None,
+	            generated=None, fringe=None, length=len(beliefs))
+
+
+def resident():
+	"""Get the resident set size of this process in KB, or, if that is not
+	available, the maximum resident set size so far.
+	"""
+	try:
+		with open("/proc/self/statm") as f:
+			return int(f.read().split()[1]) * resource.getpagesize() // 1024
+	except (OSError, IndexError, ValueError):
+		return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _run_child(queue, function, args):
+	start = resident()
+	result = function(*args)
+	result["memory"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start
+	queue.put(result)
+
+
+def run_isolated(function, args, timeout):
+	"""Run the benchmark function in a separate process, adding the peak memory
+	it used to its results, i.e. the maximum resident set size in KB, minus
+	the resident set size the process started with, inherited from this one.
+	If it does not finish within the timeout (in seconds), it is terminated;
+	if it dies before, that is noticed right away.
+	"""
+	queue = multiprocessing.Queue()
+	process = multiprocessing.Process(target=_run_child, args=(queue, function, args))
+	start = time.time()
+	process.start()
+	try:
+		result = planning.receive(queue, [process], timeout)
+	except Empty:
+		result = dict(status="timeout", time=time.time() - start)
+		process.terminate()
+	except multiprocessing.ProcessError:
+		result = dict(status="crashed", time=time.time() - start)
+	process.join()
+	return result
+
+
+def benchmark(max_blocks=6, timeout=60, domains=None, strategies=STRATEGIES, verbose=True):
+	"""Run all benchmarks and return the results as a list of dictionaries.
+	Domains can be restricted to a list of domain names. Once a configuration
+	times out for one Towers of Hanoi problem, it is skipped for the larger
+	ones.
+	"""
+	results = []
+	timed_out = set()
+	for (domain, name, goal, beliefs, actions) in problems(max_blocks):
+		if domains and domain not in domains:
+			continue
+		for config in configurations(strategies):
+			key = (domain, tuple(sorted(config.items())))
+			if key in timed_out:
+				result = dict(status="skipped")
+			else:
+				result = run_isolated(run_plan, (goal, beliefs, actions, config), timeout)
+				if result["status"] == "timeout" and domain == "hanoi":
+					timed_out.add(key)
+			result.update(config, domain=domain, problem=name)
+			results.append(result)
+			if verbose:
+				print_result(result)
+
+	if not domains or "family" in domains:
+		beliefs = create_beliefs(*family.create_persons())
+		for semi_naive in (False, True):
+			config = dict(semi_naive=semi_naive)
+			result = run_isolated(run_deduce, (beliefs, family.rules, config), timeout)
+			result.update(domain="family", problem="deduce",
+			              strategy="semi-naive" if semi_naive else "naive")
+			results.append(result)
+			if verbose:
+				print_result(result)
+	return results
+
+
+def print_result(result):
+	"""Print a single benchmark result in one line."""
+	values = [ result.get(field) for field in FIELDS ]
+	values = [ "%.3f" % v if isinstance(v, float) else "-" if v is None else str(v)
+	           for v in values ]
+	print("\t".join(values))
+	sys.stdout.flush()
+
+
+def write_json(results, filename):
+	"""Write the results to a JSON file."""
+	with open(filename, "w") as f:
+		json.dump(results, f, indent=1, sort_keys=True)
+
+
+def write_csv(results, filename):
+	"""Write the results to a CSV file."""
+	with open(filename, "w") as f:
+		writer = csv.DictWriter(f, FIELDS, extrasaction="ignore")
+		writer.writeheader()
+		writer.writerows(results)
+
+
+if __name__ == "__main__":
+
+	parser = optparse.OptionParser("benchmark.py [Options]")
+	parser.add_option("-n", "--blocks", dest="blocks", type="int", default=6,
+	                  help="maximum number of blocks for Towers of Hanoi")
+	parser.add_option("-t", "--timeout", dest="timeout", type="float", default=60,
+	                  help="timeout for each run, in seconds")
+	parser.add_option("-d", "--domains", dest="domains",
+	                  help="comma-separated list of domains to run")
+	parser.add_option("-s", "--strategies", dest="strategies",
+	                  help="comma-separated list of strategies to run")
+	parser.add_option("-j", "--json", dest="json", help="write results to JSON file")
+	parser.add_option("-c", "--csv", dest="csv", help="write results to CSV file")
+	(options, args) = parser.parse_args()
+
+	domains = options.domains.split(",") if options.domains else None
+	strategies = options.strategies.split(",") if options.strategies else STRATEGIES
+
+	print("\t".join(FIELDS))
+	results = benchmark(options.blocks, options.timeout, domains, strategies)
+	if options.json:
+		write_json(results, options.json)
+	if options.csv:
+		write_csv(results, options.csv)
@@ -62,16 +62,27 @@ put_on_other = Action("Put On Other",
 actions = [put_on_table, put_on_other]
 
 
+def create_problem():
+	"""Create the Blocks A on B on C, and D, and the solvable goals for them.
+	Returns the objects and a list of goals with their names.
+	"""
+	D = Block("D")
+	C = Block("C")
+	B = Block("B", C)
+	A = Block("A", B)
+	goals = [ ("stack-2", And(IsOn(C, D), IsOn(B, A))),
+	          ("stack-3", And(IsOn(C, D), IsOn(B, C), IsOn(A, B))),
+	          ("unstack", Not(IsOn(_, _))) ]
+	return ((A, B, C, D), goals)
+
+
 if __name__ == "__main__":
 
 	from test import *
 
 	# create Block objects
-	D = Block("D")
-	C = Block("C")
-	B = Block("B", C)
-	A = Block("A", B)
-	objects = (A, B, C, D)
+	(objects, goals) = create_problem()
+	(A, B, C, D) = objects
 
 	# create initial beliefs from objects
 	beliefs = create_beliefs(*objects)
@@ -104,10 +115,18 @@ if __name__ == "__main__":
 	test(And(IsBlock(x), Not( Or(OnTable(x), Clear(x)))), beliefs, [{x: B}])
 	test(And(IsBlock(x), Not(OnTable(x)), Not(Clear(x))), beliefs, [{x: B}])
 
+	# all matchers must give the same matches as find_matches
+	test_matchers(And(IsBlock(x), Not(Clear(x))), beliefs)
+	test_matchers(And(IsBlock(x), Not(And(OnTable(x), Clear(x)))), beliefs)
+	test_matchers(And(IsBlock(x), IsBlock(y), Not(IsOn(x, y)), Clear(y)), beliefs)
+	test_matchers(And(IsOn(x, y), Not(IsOn(y, _)), IsBlock(z), Not(IsOn(z, x))), beliefs)
+	test_matchers(And(IsBlock(x), Not(Not(IsOn(x, y))), IsOn(y, z)), beliefs)
+	test_matchers(And(IsBlock(x), IsOn(x, x)), beliefs)
+	test_matchers(Or(And(IsOn(x, y), Clear(x)), And(OnTable(x), Not(Clear(x)))), beliefs)
+
 	# planning
-	reason_plan_execute(objects, rules, And(IsOn(C, D), IsOn(B, A)), actions)
-	reason_plan_execute(objects, rules, And(IsOn(C, D), IsOn(B, C), IsOn(A, B)), actions)
-	reason_plan_execute(objects, rules, Not(IsOn(_, _)), actions)
+	for (name, goal) in goals:
+		reason_plan_execute(objects, rules, goal, actions)
 
 	# planning for unsolvable goals
 	reason_plan_execute(objects, rules, And(IsOn(A, B), Clear(B)), actions)
@@ -39,10 +39,11 @@ ride = Action("Ride",
 actions = [enter, exit, ride]
 
 
-if __name__ == "__main__":
-
-	from test import *
-
+def create_problem():
+	"""Create the initial Beliefs, with the brothers and the boat on the first
+	side, and the goal of getting all brothers to the other side. Returns the
+	Beliefs and the goal.
+	"""
 	# abbreviations for objects
 	S1, S2, F, B, U1, U2 = "Slim 1", "Slim 2", "Fat", "Boat", "Side 1", "Side 2"
 
@@ -51,10 +52,18 @@ if __name__ == "__main__":
 		Slim(S1), Slim(S2), Fat(F), Boat(B), Side(U1), Side(U2),
 		At(S1, U1), At(S2, U1), At(F, U1), At(B, U1)
 	)
+	return (beliefs, And(At(S1, U2), At(S2, U2), At(F, U2)))
+
+
+if __name__ == "__main__":
+
+	from test import *
+
+	# create initial beliefs
+	(beliefs, goal) = create_problem()
 	print_all("Initial Beliefs", beliefs)
 	
 	# Get all brothers to the other side
-	goal = And(At(S1, U2), At(S2, U2), At(F, U2))
 	plan = search_plan(goal, beliefs, actions, False, True)
 	if plan != None:
 		print_all("Plan sequence for goal %s" % goal, [ (a.name, m) for (a, m) in plan])
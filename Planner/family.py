@@ -63,11 +63,8 @@ rules += [ Rule(pre=And(Father(x, z), Parent(z, y)),      eff=Gramps(x, y))  ]
 rules += [ Rule(pre=And(Mother(x, z), Parent(z, y)),      eff=Granny(x, y))  ]
 
 
-# testing
-if __name__ == "__main__":
-	from test import *
-
-	# create Person objects
+def create_persons():
+	"""Create the Persons of the family, parents before their children."""
 	abe       = Person("Abraham Simpson", M)
 	mona      = Person("Mona Simpson", W)
 	homer     = Person("Homer Simpson", M, abe, mona)
@@ -79,8 +76,16 @@ if __name__ == "__main__":
 	bart      = Person("Bart Simpson", M, homer, marge)
 	lisa      = Person("Lisa Simpson", W, homer, marge)
 	maggie    = Person("Maggie Simpson", W, homer, marge)
+	return (abe, mona, homer, herbert, jaqueline, marge, patty, selma, bart, lisa, maggie)
+
 
-	persons = (abe, mona, homer, herbert, jaqueline, marge, patty, selma, bart, lisa, maggie)
+# testing
+if __name__ == "__main__":
+	from test import *
+
+	# create Person objects
+	persons = create_persons()
+	(abe, mona, homer, herbert, jaqueline, marge, patty, selma, bart, lisa, maggie) = persons
 
 	# create initial beliefs from objects
 	core_beliefs = create_beliefs(*persons)
@@ -95,3 +100,11 @@ if __name__ == "__main__":
 	test(And(IsPerson(x), Not(Uncle(_, x))), beliefs)
 	test(Father(x, y), beliefs)
 	test(Sibling(bart, x), beliefs)
+
+	# semi-naive deduction must give the same results as naive deduction
+	test_deduce(core_beliefs, rules)
+	# ... also for double negations of predicates deduced in the same stratum
+	Male = lambda x: Belief("male", x)
+	NotFemale = Rule(pre=And(IsPerson(x), Not(Not(Male(x)))), eff=Belief("not_female", x))
+	IsMale = Rule(pre=Gender(x, M), eff=Male(x))
+	test_deduce(core_beliefs, [NotFemale, IsMale], [Belief("not_female", bart)])
@@ -0,0 +1,268 @@
+"""Grounding.
+
+This module contains the compilation of a planning problem, given as a set of
+Beliefs and a number of (lifted) Actions, into a ground, STRIPS-like form: Each
+ground Belief is interned as a bit position, so a Belief state becomes a single
+integer, and each applicable instantiation of an Action becomes an operator
+consisting of bitmasks for its precondition and its added and removed Beliefs.
+Testing whether an operator is applicable in a state and applying it are then
+just a few bitwise operations instead of pattern matching.
+
+Not every Action can be grounded this way: All variables have to be bound by
+the positive Beliefs at the top level of the precondition, except for variables
+that only occur in negated Beliefs, which are treated as wildcards, just like
+find_matches does. Also, the effect must not contain any unbound variables.
+"""
+
+from knowledge import *
+from reasoning import *
+
+
+class GroundCondition:
+	"""Ground Condition class.
+
+	A ground condition in disjunctive normal form: a list of alternatives, each
+	being a tuple of a bitmask of Beliefs that have to hold and a bitmask of
+	Beliefs that must not hold. The condition holds, if any alternative holds.
+	"""
+
+	__slots__ = ("alternatives",)
+
+	def __init__(self, alternatives):
+		self.alternatives = alternatives
+
+	def __repr__(self):
+		return "GroundCondition(%s)" % ", ".join("+%x-%x" % alt for alt in self.alternatives)
+
+	def satisfied(self, state):
+		"""Check whether the condition holds in the given state."""
+		for (pos, neg) in self.alternatives:
+			if state & pos == pos and not state & neg:
+				return True
+		return False
+
+	def defect(self, state):
+		"""Get the number of Beliefs that would have to be added to or removed
+		from the state for the condition to hold, for the best alternative.
+		"""
+		return min([ bin(pos & ~state).count("1") + bin(neg & state).count("1")
+		             for (pos, neg) in self.alternatives ] or [1])
+
+
+class GroundOperator:
+	"""Ground Operator class.
+
+	An instantiation of an Action with a match for its variables. The operator
+	is applicable if its ground precondition holds, and applying it removes the
+	Beliefs of the delete bitmask and then adds those of the add bitmask.
+	"""
+
+	__slots__ = ("action", "match", "pre", "add", "delete")
+
+	def __init__(self, action, match, pre, add, delete):
+		self.action = action
+		self.match = match
+		self.pre = pre
+		self.add = add
+		self.delete = delete
+
+	def __repr__(self):
+		return "%s%s" % (self.action.name, self.match)
+
+	def applicable(self, state):
+		"""Check whether the operator is applicable in the given state."""
+		return self.pre.satisfied(state)
+
+	def apply(self, state):
+		"""Get the state resulting from applying the operator to the state."""
+		return (state & ~self.delete) | self.add
+
+
+class GroundTask:
+	"""Ground Task class.
+
+	The ground representation of a planning problem. On creation, the Beliefs
+	reachable from the given Beliefs are determined by applying the Actions in
+	a relaxed way, ignoring all but the positive Beliefs in their preconditions
+	and all removing effects. All the Actions' instantiations found this way are
+	then compiled to Ground Operators. If Rules are given, those are applied to
+	the initial Beliefs first.
+	"""
+
+	def __init__(self, beliefs, actions, rules=()):
+		if rules:
+			beliefs = deduce(beliefs, *rules, semi_naive=True)
+		self.atoms = []
+		self.index = {}
+		self.state = self.encode(beliefs)
+
+		# find reachable beliefs and instantiations of actions
+		(reached, instances) = relaxed_reachability(beliefs, actions)
+
+		# compile instances to operators, now that all beliefs are known
+		for belief in reached:
+			self.intern(belief)
+		self.reached = reached
+		self.operators = [ self.operator(action, match) for (action, match) in instances ]
+
+	def intern(self, belief):
+		"""Get the bit position for the Belief, creating a new one if needed."""
+		if belief not in self.index:
+			self.index[belief] = len(self.atoms)
+			self.atoms.append(belief)
+		return self.index[belief]
+
+	def encode(self, beliefs):
+		"""Encode the Beliefs as a state, i.e. an integer bitmask."""
+		state = 0
+		for belief in beliefs:
+			state |= 1 << self.intern(belief)
+		return state
+
+	def decode(self, state):
+		"""Decode the state to a list of Beliefs."""
+		return [ belief for (i, belief) in enumerate(self.atoms) if state >> i & 1 ]
+
+	def operator(self, action, match):
+		"""Compile the Action with the given match to a Ground Operator."""
+		add, delete = 0, 0
+		for (belief, negation) in effects(action.eff, match):
+			bit = 1 << self.intern(belief)
+			if negation:
+				add, delete = add & ~bit, delete | bit
+			else:
+				add, delete = add | bit, delete & ~bit
+		pre = GroundCondition(self.compile(action.pre, match))
+		return GroundOperator(action, match, pre, add, delete)
+
+	def condition(self, condition, decompose=False):
+		"""Compile the condition, e.g. a goal, to a Ground Condition, holding
+		in all states in which there is a match for the condition. If decompose
+		is set, Conjunctions are kept, and only their conditions are compiled,
+		e.g. for Serial Decomposition.
+		"""
+		if decompose and isinstance(condition, And):
+			return And(*(self.condition(cond, True) for cond in condition.conditions))
+		alternatives = []
+		for match in bindings(condition, self.reached):
+			alternatives += self.compile(condition, match)
+		return GroundCondition(alternatives)
+
+	def compile(self, condition, match):
+		"""Compile the (top-level) condition with the given match to a list of
+		alternatives. Each of the condition's terms is compiled using only those
+		variables that find_matches would have bound when getting to that term.
+		"""
+		conditions = condition.conditions if isinstance(condition, And) else (condition,)
+		alternatives = [(0, 0)]
+		bound = {}
+		for cond in conditions:
+			if isinstance(cond, Belief):
+				for term in (cond.subj, cond.obj):
+					if var(term, False):
+						bound[term] = match[term]
+			alternatives = [ (p1 | p2, n1 | n2)
+			                 for (p1, n1) in alternatives
+			                 for (p2, n2) in self.dnf(substitute_variables(cond, bound))
+			                 if not (p1 | p2) & (n1 | n2) ]
+		return alternatives
+
+	def dnf(self, condition, negation=False):
+		"""Compile the condition to a list of alternatives, i.e. tuples of bit
+		masks of Beliefs that have to hold and that must not hold. Variables in
+		negated Beliefs act as wildcards; positive Beliefs may have wildcards, but
+		no other variables.
+		"""
+		if isinstance(condition, Belief):
+			if not has_variables(condition):
+				bit = 1 << self.intern(condition)
+				return [(0, bit)] if negation else [(bit, 0)]
+			if not negation and (var(condition.subj, False) or var(condition.obj, False)):
+				raise ValueError("Can not ground condition %s" % condition)
+			matching = [ self.index[b] for b in candidates(condition, self.reached)
+			             if do_match(condition, b) ]
+			if negation:
+				return [(0, sum(1 << i for i in matching))]
+			return [ (1 << i, 0) for i in matching ]
+
+		elif ((isinstance(condition, And) and not negation) or
+		      (isinstance(condition, Or)  and     negation)):
+			alternatives = [(0, 0)]
+			for cond in condition.conditions:
+				alternatives = [ (p1 | p2, n1 | n2)
+				                 for (p1, n1) in alternatives
+				                 for (p2, n2) in self.dnf(cond, negation)
+				                 if not (p1 | p2) & (n1 | n2) ]
+			return alternatives
+
+		elif ((isinstance(condition, And) and     negation) or
+		      (isinstance(condition, Or)  and not negation)):
+			alternatives = []
+			for cond in condition.conditions:
+				alternatives += self.dnf(cond, negation)
+			return alternatives
+
+		elif isinstance(condition, Not):
+			return self.dnf(condition.cond, not negation)
+
+
+def relaxed_reachability(beliefs, actions):
+	"""Determine the Beliefs reachable from the given Beliefs by applying the
+	Actions in a relaxed way, ignoring all but the positive Beliefs at the top
+	level of their preconditions and all removing effects. Returns a Belief
+	Base of the reachable Beliefs and a list of the instantiations of Actions
+	found on the way, as tuples of action and match.
+	"""
+	reached = BeliefBase(beliefs)
+	instances = []
+	known = set()
+	changed = True
+	while changed:
+		changed = False
+		for action in actions:
+			for match in bindings(action.pre, reached):
+				key = (id(action), frozenset(match.items()))
+				if key in known:
+					continue
+				known.add(key)
+				instances += [(action, match)]
+				for (belief, negation) in effects(action.eff, match):
+					if has_variables(belief):
+						raise ValueError("Can not ground effect %s of %s" % (belief, action))
+					if not negation:
+						changed |= reached.add(belief)
+	return (reached, instances)
+
+
+def bindings(condition, beliefs):
+	"""Get the distinct matches for the positive Beliefs at the top level of the
+	condition, in the same order as find_matches would bind them.
+	"""
+	conditions = condition.conditions if isinstance(condition, And) else (condition,)
+	positives = [ cond for cond in conditions if isinstance(cond, Belief) ]
+	result = []
+	for match in find_matches(And(*positives), beliefs):
+		if match not in result:
+			result += [match]
+	return result
+
+
+def effects(condition, match={}, negation=False):
+	"""Get the Beliefs the effect condition adds or removes, as a list of tuples
+	of Belief and whether it is removed, in the order update would apply them.
+	"""
+	if match:
+		condition = substitute_variables(condition, match)
+	if isinstance(condition, Belief):
+		return [(condition, negation)]
+	if isinstance(condition, And) or isinstance(condition, Or):
+		return [ e for cond in condition.conditions for e in effects(cond, {}, negation) ]
+	if isinstance(condition, Not):
+		return effects(condition.cond, {}, not negation)
+
+
+def expand_ground(state, operators):
+	"""Apply each applicable Ground Operator to the state and return the results
+	as a List of Tuples (operator, match, new_state).
+	"""
+	return [ (op, op.match, op.apply(state)) for op in operators if op.pre.satisfied(state) ]
@@ -65,18 +65,11 @@ put_on_stack = Action("Put On Stack",
 actions = [put_on_other, put_on_stack]
 
 
-if __name__ == "__main__":
-
-	import optparse
-	parser = optparse.OptionParser("hanoi.py [Options] [Blocks]")
-	parser.add_option("-s", "--serial", dest="serial", help="serial decomposition?", action="store_true")
-	parser.add_option("-b", "--bfs", dest="bfs", help="breadth-first search?", action="store_true")
-	(options, args) = parser.parse_args()
-	
-	num_blocks = int(args[0]) if args else 3
-	serial = options.serial
-	bfs = options.bfs
-	
+def create_problem(num_blocks):
+	"""Create the Stacks and the given number of Blocks, all on the first
+	Stack, and the goal of moving them to the third Stack. Returns the objects
+	and the goal.
+	"""
 	# create Stacks and one Block
 	S1 = Stack("Stack 1")
 	S2 = Stack("Stack 2")
@@ -92,10 +85,40 @@ if __name__ == "__main__":
 		objects += [ B ]
 		goals   += [ IsOn(B, last) ]
 		last = B
+	return (objects, And(*goals))
+
+
+if __name__ == "__main__":
+
+	import optparse
+	parser = optparse.OptionParser("hanoi.py [Options] [Blocks]")
+	parser.add_option("-s", "--serial", dest="serial", help="serial decomposition?", action="store_true")
+	parser.add_option("-k", "--backtrack", dest="backtrack", help="backtrack in serial decomposition?", action="store_true")
+	parser.add_option("-b", "--bfs", dest="bfs", help="breadth-first search?", action="store_true")
+	parser.add_option("-g", "--ground", dest="ground", help="ground actions?", action="store_true")
+	parser.add_option("-t", "--strategy", dest="strategy", help="search strategy (ids, idastar, bfs, astar, wastar, gbfs, beam, bidirectional, portfolio)")
+	parser.add_option("-e", "--heuristic", dest="heuristic", help="heuristic for informed search (hmax, hadd, hff)")
+	parser.add_option("-p", "--processes", dest="processes", type="int", help="number of processes for parallel breadth-first search")
+	parser.add_option("-y", "--symmetry", dest="symmetry", help="prune symmetric states?", action="store_true")
+	parser.add_option("-d", "--directory", dest="directory", help="directory for keeping breadth-first search layers on disk")
+	parser.add_option("-w", "--width", dest="width", type="int", default=8, help="beam width for beam search")
+	parser.add_option("-l", "--time-limit", dest="time_limit", type="float", help="time limit for beam search, in seconds")
+	(options, args) = parser.parse_args()
+	
+	num_blocks = int(args[0]) if args else 3
+	serial = options.serial
+	bfs = options.bfs
+	
+	# create Stacks and Blocks
+	(objects, goal) = create_problem(num_blocks)
 	
 	# plan!
 	import test
-	test.reason_plan_execute(objects, rules, And(*goals), actions, serial, bfs)
+	test.reason_plan_execute(objects, rules, goal, actions, serial, bfs, ground=options.ground, strategy=options.strategy,
+	                         heuristic=options.heuristic, processes=options.processes,
+	                         symmetry=options.symmetry, directory=options.directory,
+	                         beam_width=options.width, time_limit=options.time_limit,
+	                         backtrack=options.backtrack)
 	
 #	RESULTS	
 #	Exponential growth: Length of plan doubles with every new block; size of
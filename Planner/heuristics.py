@@ -0,0 +1,310 @@
+"""Heuristics.
+
+This module contains heuristics for informed search based on the relaxed
+planning graph of a planning problem, i.e. the problem with all removing
+effects (the Not parts of the Actions' effects) ignored. In the relaxed problem,
+Beliefs once reached are never lost again, so the cost of reaching each Belief
+from a given state can be computed in polynomial time, in a single sweep.
+
+Implemented Heuristics:
+- h_max: the cost of the most expensive of the goal's Beliefs (admissible)
+- h_add: the sum of the costs of the goal's Beliefs (not admissible, but more
+  informative, assuming the Beliefs are reached independently)
+- h_FF:  the length of a relaxed plan extracted from the cheapest supporters
+  found for h_add (not admissible, counting shared actions only once)
+
+Negated conditions in preconditions and goals are ignored as well, as are
+variables that are not bound by the positive Beliefs at the top level of a
+condition, making the relaxation still more optimistic. The relaxed planning
+graph can be built from lifted Actions and Beliefs, or from a Ground Task, in
+which case the heuristics can be evaluated for ground states.
+"""
+
+from knowledge import *
+from reasoning import *
+from grounding import GroundCondition, relaxed_reachability, bindings, effects
+from collections import OrderedDict
+import heapq
+
+INFINITY = float("inf")
+CACHE_SIZE = 1000
+
+
+class RelaxedPlanningGraph:
+	"""Relaxed Planning Graph class.
+
+	The relaxed planning graph, compiled to a network of facts and relaxed
+	operators once for all the states to be evaluated. Facts are the reachable
+	Beliefs plus one auxiliary fact for each disjunction of Beliefs (e.g. for a
+	wildcard matching several Beliefs), reached with zero cost by each of its
+	Beliefs. Each relaxed operator has a tuple of facts as precondition and a
+	tuple of facts it adds; each alternative of a disjunctive precondition
+	yields an operator of its own.
+
+	The heuristics h_max, h_add and h_ff are methods taking a goal and a state,
+	i.e. Beliefs or a ground state, so they can be used as heuristic for search.
+	The values of the most recently evaluated states, at most cache_size (or
+	CACHE_SIZE) of them, are cached, so that states evaluated again shortly
+	after, e.g. in the restarts of Beam Search, are evaluated only once.
+	"""
+
+	def __init__(self, beliefs, actions, task=None, cache_size=None):
+		"""Create the relaxed planning graph for the Beliefs and Actions, or for
+		the ground operators of the Ground Task, if given.
+		"""
+		self.index = {}
+		self.groups = {}
+		self.pre = []
+		self.add = []
+		self.cost = []
+		self.label = []
+		self.goals = {}
+		self.cache = OrderedDict()
+		self.cache_size = cache_size if cache_size is not None else CACHE_SIZE
+		if task is None:
+			(reached, instances) = relaxed_reachability(beliefs, actions)
+			for belief in reached:
+				self.fact(belief)
+			self.reached = reached
+			for (action, match) in instances:
+				adds = [ self.index[belief] for (belief, negation) in effects(action.eff, match)
+				         if not negation ]
+				for alternative in self.relax(substitute_variables(action.pre, match)):
+					self.operator(alternative, adds, 1, (action, match))
+			self.bits = None
+		else:
+			for belief in task.atoms:
+				self.fact(belief)
+			self.reached = task.reached
+			self.bits = list(range(len(task.atoms)))
+			for op in task.operators:
+				adds = self.ground_facts(op.add)
+				for alternative in self.relax(op.pre):
+					self.operator(alternative, adds, 1, op)
+
+		# operators to trigger for each fact and precondition counters
+		self.triggers = [ [] for i in range(len(self.index) + len(self.groups)) ]
+		for (o, pre) in enumerate(self.pre):
+			for f in pre:
+				self.triggers[f].append(o)
+		self.counters = [ len(pre) for pre in self.pre ]
+		self.free = [ o for (o, pre) in enumerate(self.pre) if not pre ]
+
+	def fact(self, belief):
+		"""Get the fact for the Belief, creating a new one if needed."""
+		if belief not in self.index:
+			self.index[belief] = len(self.index) + len(self.groups)
+		return self.index[belief]
+
+	def group(self, facts):
+		"""Get the fact for the disjunction of the facts, creating a new one and
+		the zero-cost operators reaching it if needed.
+		"""
+		facts = tuple(sorted(set(facts)))
+		if len(facts) == 1:
+			return facts[0]
+		if facts not in self.groups:
+			g = self.groups[facts] = len(self.index) + len(self.groups)
+			for f in facts:
+				self.operator([[f]], [g], 0, None)
+		return self.groups[facts]
+
+	def operator(self, alternative, adds, cost, label):
+		"""Add a relaxed operator for the alternative, a list of disjunctions of
+		facts, all of which have to be reached.
+		"""
+		self.pre.append(tuple(set(self.group(facts) for facts in alternative)))
+		self.add.append(tuple(adds))
+		self.cost.append(cost)
+		self.label.append(label)
+
+	def ground_facts(self, bitmask):
+		"""Get the facts for the bits set in the ground state or bitmask; bits
+		interned by the Ground Task after the graph was built are skipped.
+		"""
+		facts = []
+		while bitmask:
+			low = bitmask & -bitmask
+			i = low.bit_length() - 1
+			if i < len(self.bits):
+				facts.append(self.bits[i])
+			bitmask ^= low
+		return facts
+
+	def relax(self, condition):
+		"""Relax the condition to a list of alternatives, each being a list of
+		disjunctions of facts that have to be reached. Negated conditions and
+		Beliefs with variables other than wildcards are dropped. An empty list
+		means that the condition can not be reached at all.
+		"""
+		if isinstance(condition, GroundCondition):
+			return [ [ [f] for f in self.ground_facts(pos) ]
+			         for (pos, neg) in condition.alternatives
+			         if pos >> len(self.bits) == 0 ]
+
+		elif isinstance(condition, Belief):
+			if var(condition.subj, False) or var(condition.obj, False):
+				return [[]]
+			if not has_variables(condition):
+				return [[[self.index[condition]]]] if condition in self.index else []
+			facts = [ self.index[b] for b in candidates(condition, self.reached)
+			          if do_match(condition, b) ]
+			return [[facts]] if facts else []
+
+		elif isinstance(condition, And):
+			alternatives = [[]]
+			for cond in condition.conditions:
+				alternatives = [ a1 + a2 for a1 in alternatives
+				                         for a2 in self.relax(cond) ]
+			return alternatives
+
+		elif isinstance(condition, Or):
+			return [ a for cond in condition.conditions for a in self.relax(cond) ]
+
+		elif isinstance(condition, Not):
+			return [[]]
+
+	def relax_goal(self, goal):
+		"""Get the relaxed alternatives for the goal, which may have variables
+		bound by the positive Beliefs at its top level, or may be a Conjunction
+		of Ground Conditions, as used in Serial Decomposition.
+		"""
+		if id(goal) not in self.goals:
+			if isinstance(goal, GroundCondition) or not has_variables(goal):
+				alternatives = self.relax(goal)
+			else:
+				alternatives = []
+				for match in bindings(goal, self.reached):
+					alternatives += self.relax(substitute_variables(goal, match))
+			self.goals[id(goal)] = (goal, alternatives)
+		return self.goals[id(goal)][1]
+
+	def state_facts(self, beliefs):
+		"""Get the facts holding in the Beliefs or ground state."""
+		if isinstance(beliefs, int):
+			return self.ground_facts(beliefs)
+		return [ self.index[b] for b in beliefs if b in self.index ]
+
+	def costs(self, beliefs, combine):
+		"""Compute the cost of reaching each fact from the Beliefs, combining the
+		costs of an operator's preconditions with the given function (max or
+		sum), using a generalized Dijkstra search. Returns the list of costs and
+		the list of the cheapest supporting operators of each fact.
+		"""
+		n = len(self.triggers)
+		cost = [INFINITY] * n
+		supporter = [None] * n
+		done = [False] * n
+		counters = self.counters[:]
+		accumulated = [0] * len(self.pre)
+		queue = []
+		for f in self.state_facts(beliefs):
+			cost[f] = 0
+			queue.append((0, f))
+		for o in self.free:
+			for g in self.add[o]:
+				if self.cost[o] < cost[g]:
+					cost[g], supporter[g] = self.cost[o], o
+					queue.append((self.cost[o], g))
+		heapq.heapify(queue)
+
+		while queue:
+			(c, f) = heapq.heappop(queue)
+			if done[f]:
+				continue
+			done[f] = True
+			for o in self.triggers[f]:
+				accumulated[o] = combine(accumulated[o], c)
+				counters[o] -= 1
+				if counters[o] == 0:
+					new = accumulated[o] + self.cost[o]
+					for g in self.add[o]:
+						if new < cost[g]:
+							cost[g], supporter[g] = new, o
+							heapq.heappush(queue, (new, g))
+		return (cost, supporter)
+
+	def evaluate(self, goal, alternatives, cost, combine):
+		"""Get the cost of the cheapest alternative and the alternative itself."""
+		best = (INFINITY, None)
+		for alternative in alternatives:
+			value = 0
+			for f in alternative:
+				value = combine(value, min(cost[g] for g in f))
+			if value < best[0]:
+				best = (value, alternative)
+		return best
+
+	def cached(self, kind, goal, beliefs, compute):
+		"""Get the heuristic value from the cache, or compute and cache it."""
+		if isinstance(beliefs, int):
+			key = beliefs
+		elif isinstance(beliefs, BeliefBase):
+			key = (beliefs.ids, beliefs.mask)
+		else:
+			key = frozenset(beliefs)
+		key = (kind, id(goal), key)
+		if key in self.cache:
+			self.cache.move_to_end(key)
+			return self.cache[key]
+		value = self.cache[key] = compute(goal, beliefs)
+		if len(self.cache) > self.cache_size:
+			self.cache.popitem(last=False)
+		return value
+
+	def h_max(self, goal, beliefs):
+		"""Get the h_max value of the goal in the Beliefs."""
+		return self.cached("max", goal, beliefs, self._h_max)
+
+	def h_add(self, goal, beliefs):
+		"""Get the h_add value of the goal in the Beliefs."""
+		return self.cached("add", goal, beliefs, self._h_add)
+
+	def h_ff(self, goal, beliefs):
+		"""Get the h_FF value of the goal in the Beliefs."""
+		return self.cached("ff", goal, beliefs, self._h_ff)
+
+	def _h_max(self, goal, beliefs):
+		(cost, supporter) = self.costs(beliefs, max)
+		return self.evaluate(goal, self.relax_goal(goal), cost, max)[0]
+
+	def _h_add(self, goal, beliefs):
+		(cost, supporter) = self.costs(beliefs, _sum)
+		return self.evaluate(goal, self.relax_goal(goal), cost, _sum)[0]
+
+	def _h_ff(self, goal, beliefs):
+		(cost, supporter) = self.costs(beliefs, _sum)
+		(value, alternative) = self.evaluate(goal, self.relax_goal(goal), cost, _sum)
+		if alternative is None:
+			return INFINITY
+
+		# extract relaxed plan, going back from the cheapest facts of the goal
+		plan = set()
+		stack = [ min(f, key=lambda g: cost[g]) for f in alternative ]
+		seen = set(stack)
+		while stack:
+			o = supporter[stack.pop()]
+			if o is None:
+				continue
+			if self.label[o] is not None:
+				plan.add(id(self.label[o]))
+			for f in self.pre[o]:
+				if f not in seen:
+					seen.add(f)
+					stack.append(f)
+		return len(plan)
+
+
+def _sum(a, b):
+	return a + b
+
+
+HEURISTICS = {"hmax": "h_max", "hadd": "h_add", "hff": "h_ff"}
+
+def relaxed_heuristic(name, beliefs, actions, task=None):
+	"""Get the heuristic function with the given name (hmax, hadd, or hff) for
+	the relaxed planning graph of the Beliefs and Actions, or of the Ground Task.
+	"""
+	if name not in HEURISTICS:
+		raise ValueError("Unknown heuristic: %r" % name)
+	return getattr(RelaxedPlanningGraph(beliefs, actions, task), HEURISTICS[name])
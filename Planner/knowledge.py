@@ -5,19 +5,59 @@ This module contains basic knowledge representation concepts for a simple AI
 framework.
 """
 
+import itertools
+import random
+import weakref
+
 
 class Belief:
 	"""Belief class.
 	
 	A Belief is a tuple of Subject, Predicate, Object.
 	Examples: Belief("is_block", "block_A"), Belief("is_on", "block_A", "block_B")
+
+	Beliefs are immutable flyweights: Each distinct Belief is created only once
+	and interned, so creating the same Belief again just returns the existing
+	instance. The hash of a Belief is computed only once, too, and two interned
+	Beliefs are equal only if they are the same instance. Only Beliefs with
+	unhashable parts, or with parts that are equal to those of an interned
+	Belief, but of different types (e.g. 1 and True), or, unless they are
+	plain values such as strings and numbers, not the very same objects (e.g.
+	two equal instances of some class), are not interned, so that a Belief
+	always refers to the objects it has been created with.
+	Interned Beliefs are only referenced weakly, so Beliefs that are not used
+	anymore are dropped from the intern table.
 	"""
 
-	def __init__(self, pred, subj, obj=None):
-		"""Create new Fact with predicate, subject and (optional) object."""
-		self.pred = pred
-		self.subj = subj
-		self.obj = obj
+	__slots__ = ("pred", "subj", "obj", "_hash", "__weakref__")
+
+	def __new__(cls, pred, subj, obj=None):
+		"""Get the Belief with predicate, subject and (optional) object."""
+		key = (pred, subj, obj)
+		try:
+			belief = _interned.get(key)
+		except TypeError:
+			belief, key = None, None
+		if (belief is not None and type(belief) is cls
+		    and _same(belief.subj, subj) and _same(belief.obj, obj)):
+			return belief
+		belief = object.__new__(cls)
+		belief.pred = pred
+		belief.subj = subj
+		belief.obj = obj
+		belief._hash = hash(key) if key is not None else None
+		if key is not None and key not in _interned:
+			_interned[key] = belief
+		return belief
+
+	def __reduce__(self):
+		# just get the Belief when unpickling, instead of restoring the slots of
+		# a possibly interned Belief, e.g. with a hash of another process
+		return (type(self), (self.pred, self.subj, self.obj))
+
+	def __setstate__(self, state):
+		# ignore the slots of Beliefs pickled with their state
+		pass
 		
 	def __repr__(self):
 		"""Print Belief as 'pred(subj[, obj])'."""
@@ -28,12 +68,27 @@ class Belief:
 			
 	def __eq__(self, other):
 		"""Beliefs are equal, if pred, subj, and obj are equal."""
-		return (type(self) == type(other) 
+		if self is other:
+			return True
+		return (type(self) == type(other) and self._hash == other._hash
 				and (self.pred, self.subj, self.obj) == (other.pred, other.subj, other.obj))
-	
+
 	def __hash__(self):
-		"""return Belief's hash as a combination of the hashes of its parts."""
-		return hash(self.pred) + (2 * hash(self.subj)) + (4 * hash(self.obj))
+		"""Return Belief's hash, computed once from the hashes of its parts."""
+		if self._hash is None:
+			return hash((self.pred, self.subj, self.obj))
+		return self._hash
+
+
+_interned = weakref.WeakValueDictionary()
+
+_VALUES = (str, int, float, type(None))
+
+def _same(value, other):
+	"""Check whether the equal parts of two Beliefs can be shared, i.e. if they
+	are the same object, or plain values of the same type.
+	"""
+	return value is other or (type(value) is type(other) and type(value) in _VALUES)
 
 
 class And:
@@ -140,6 +195,205 @@ class Action(Rule):
 			self.impl(**match)
 
 
+class BeliefBase:
+	"""Belief Base class.
+
+	A Belief Base is a collection of Beliefs, just like a list of Beliefs, but
+	the Beliefs are additionally indexed by their predicate, by predicate and
+	subject, and by predicate and object, so that the Beliefs matching a given
+	pattern can be looked up without scanning all the Beliefs. Like a list,
+	the Belief Base keeps the order in which the Beliefs have been added.
+
+	Further, each Belief Base keeps track of the set of its Beliefs' ids as a
+	bitmask, which can be used as an exact and compact key for the set, and of
+	the Zobrist hash of that set, i.e. the XOR of its Beliefs' random keys, both
+	being updated incrementally as Beliefs are added and removed. The ids are
+	taken from the given Belief Ids, or else from those of the given Belief
+	Base, if any, or from new Belief Ids, and are shared by all copies, so only
+	the masks of Belief Bases derived from the same one can be compared.
+
+	Copies of a Belief Base share their structure: Copying just copies the
+	top level of the indices, i.e. one entry per predicate, and the per-
+	predicate parts of the indices are copied only when a Belief with that
+	predicate is added to or removed from either the copy or the original.
+	"""
+
+	def __init__(self, beliefs=(), ids=None):
+		"""Create new Belief Base holding the given Beliefs."""
+		if ids is None:
+			ids = beliefs.ids if isinstance(beliefs, BeliefBase) else BeliefIds()
+		self.ids = ids
+		self.by_pred = {}
+		self.by_subj = {}
+		self.by_obj = {}
+		self.owned = set()
+		self.size = 0
+		self.mask = 0
+		self.zobrist = 0
+		self.add_all(beliefs)
+
+	def __repr__(self):
+		return "BeliefBase(%r)" % list(self)
+
+	def __eq__(self, other):
+		"""Belief Bases are equal, if they hold the same Beliefs."""
+		if type(self) != type(other):
+			return False
+		if self.ids is other.ids:
+			return self.mask == other.mask
+		return self.size == other.size and all(belief in self for belief in other)
+
+	def __contains__(self, belief):
+		return belief in self.by_pred.get(belief.pred, ())
+
+	def __iter__(self):
+		"""Iterate the Beliefs in the order in which they have been added."""
+		beliefs = [ (seq, belief) for bucket in self.by_pred.values()
+		                          for (belief, seq) in bucket.items() ]
+		beliefs.sort(key=lambda item: item[0])
+		return iter([ belief for (seq, belief) in beliefs ])
+
+	def __len__(self):
+		return self.size
+
+	def own(self, index, key):
+		"""Get the dictionary stored in the index for the key, creating it if it
+		does not exist, or copying it if it is shared with other Belief Bases.
+		"""
+		part = index.get(key)
+		if part is None or id(part) not in self.owned:
+			part = index[key] = part.copy() if part is not None else {}
+			self.owned.add(id(part))
+		return part
+
+	def add(self, belief):
+		"""Add the Belief to the Belief Base and its indices. Return True, if
+		the Belief was not already in the Belief Base.
+		"""
+		if belief in self:
+			return False
+		seq = next(_sequence)
+		self.own(self.by_pred, belief.pred)[belief] = seq
+		self.own(self.own(self.by_subj, belief.pred), belief.subj)[belief] = seq
+		self.own(self.own(self.by_obj,  belief.pred), belief.obj )[belief] = seq
+		(i, z) = self.ids[belief]
+		self.size += 1
+		self.mask |= 1 << i
+		self.zobrist ^= z
+		return True
+
+	def add_all(self, beliefs):
+		"""Add all the Beliefs to the Belief Base, just like add does, but
+		getting the parts of the indices for each predicate only once. Return the
+		number of Beliefs that were not already in the Belief Base.
+		"""
+		parts = {}
+		ids = []
+		for belief in beliefs:
+			pred = belief.pred
+			if pred not in parts:
+				parts[pred] = (self.own(self.by_pred, pred), self.own(self.by_subj, pred),
+				               self.own(self.by_obj, pred))
+			(bucket, by_subj, by_obj) = parts[pred]
+			if belief in bucket:
+				continue
+			seq = next(_sequence)
+			bucket[belief] = seq
+			self.own(by_subj, belief.subj)[belief] = seq
+			self.own(by_obj,  belief.obj )[belief] = seq
+			(i, z) = self.ids[belief]
+			ids.append(i)
+			self.zobrist ^= z
+
+		# set the bits of the mask all at once, instead of one after another
+		if ids:
+			bits = bytearray(max(ids) // 8 + 1)
+			for i in ids:
+				bits[i >> 3] |= 1 << (i & 7)
+			self.mask |= int.from_bytes(bits, "little")
+		self.size += len(ids)
+		return len(ids)
+
+	def remove(self, belief):
+		"""Remove the Belief from the Belief Base and its indices. Return True,
+		if the Belief was in the Belief Base.
+		"""
+		if belief not in self:
+			return False
+		bucket = self.own(self.by_pred, belief.pred)
+		del bucket[belief]
+		if not bucket:
+			del self.by_pred[belief.pred]
+		for (index, key) in ((self.by_subj, belief.subj), (self.by_obj, belief.obj)):
+			part = self.own(index, belief.pred)
+			bucket = self.own(part, key)
+			del bucket[belief]
+			if not bucket:
+				del part[key]
+				if not part:
+					del index[belief.pred]
+		(i, z) = self.ids[belief]
+		self.size -= 1
+		self.mask &= ~(1 << i)
+		self.zobrist ^= z
+		return True
+
+	def copy(self):
+		"""Create a copy of this Belief Base, which can be altered without
+		altering the original, sharing all the per-predicate parts of the
+		indices until they are altered.
+		"""
+		other = BeliefBase(ids=self.ids)
+		other.by_pred = self.by_pred.copy()
+		other.by_subj = self.by_subj.copy()
+		other.by_obj  = self.by_obj.copy()
+		other.size = self.size
+		other.mask = self.mask
+		other.zobrist = self.zobrist
+		self.owned = set()
+		return other
+
+	def lookup(self, pred, subj=None, obj=None, bound_subj=False, bound_obj=False):
+		"""Get the Beliefs with the given predicate, and with the given subject
+		and object, if those are flagged as being bound. Uses the most specific
+		index available for this combination of bound parts.
+		"""
+		if bound_subj and bound_obj:
+			belief = Belief(pred, subj, obj)
+			return (belief,) if belief in self else ()
+		if bound_subj:
+			return self.by_subj.get(pred, {}).get(subj, ())
+		if bound_obj:
+			return self.by_obj.get(pred, {}).get(obj, ())
+		return self.by_pred.get(pred, ())
+
+
+class BeliefIds:
+	"""Belief Ids class.
+
+	Assigns ids and (random) Zobrist keys to Beliefs, as used for the bitmasks
+	and hashes of Belief Bases. Each distinct Belief is assigned the next free
+	id when first used. The ids are meant to be scoped to one problem or search,
+	so that the bitmasks stay as small as the number of Beliefs used there.
+	"""
+
+	def __init__(self, seed=0):
+		self.ids = {}
+		self.random = random.Random(seed)
+
+	def __len__(self):
+		return len(self.ids)
+
+	def __getitem__(self, belief):
+		"""Get the id of the Belief together with its Zobrist key."""
+		entry = self.ids.get(belief)
+		if entry is None:
+			entry = self.ids[belief] = (len(self.ids), self.random.getrandbits(64))
+		return entry
+
+
+_sequence = itertools.count()
+
 
 def create_beliefs(*objects):
 	"""Create a number of Beliefs representing the given list of objects. First,
@@ -148,17 +402,64 @@ def create_beliefs(*objects):
 	a Belief is created in the form "Belief(<attribute>, <obj>, <value>)".
 	If the value is iterable, than one Belief is created for each item.
 	"""
-	beliefs = []
+	return list(iter_beliefs(objects))
+
+
+def create_belief_base(*objects):
+	"""Create a Belief Base holding the Beliefs representing the given objects,
+	just like create_beliefs, adding the Beliefs to the Belief Base right away
+	instead of building a list first.
+	"""
+	beliefs = BeliefBase()
+	beliefs.add_all(iter_beliefs(objects))
+	return beliefs
+
+
+def iter_beliefs(objects):
+	"""Generate the Beliefs representing the given objects, in the same order
+	as create_beliefs. Attributes declared in __slots__, but not set, are
+	skipped.
+	"""
 	for obj in objects:
-		beliefs += [Belief(obj.__class__.__name__, obj) ]
-		for field in dir(obj):
-			value = getattr(obj, field)
-			if field[0] != "_" and not callable(value):
+		yield Belief(obj.__class__.__name__, obj)
+		for field in object_fields(obj):
+			try:
+				value = getattr(obj, field)
+			except AttributeError:
+				continue
+			if not callable(value):
 				if hasattr(value, "__iter__") and type(value) != str:
-					beliefs += [ Belief(field, obj, v) for v in value ]
+					for v in value:
+						yield Belief(field, obj, v)
 				else:
-					beliefs += [ Belief(field, obj, value) ]
-	return beliefs
+					yield Belief(field, obj, value)
+
+
+_schemas = {}
+
+def object_fields(obj):
+	"""Get the names of the object's attributes that may be turned into Beliefs,
+	in the order of dir(obj): all public attributes, except for those that are
+	callable members of the class (e.g. methods) and not overridden by the
+	object itself. As calling dir for each object is slow, the names are
+	determined once for each class and set of instance attributes and cached;
+	for classes using __slots__, the slots are found as members of the class.
+	Only objects of classes defining their own __dir__ are not cached.
+	"""
+	cls = type(obj)
+	instance = getattr(obj, "__dict__", None) or {}
+	key = (cls, tuple(instance))
+	if key not in _schemas:
+		if cls.__dir__ is not object.__dir__:
+			return [ field for field in dir(obj) if field[0] != "_" ]
+		fields = set(field for field in instance if field[0] != "_")
+		for field in dir(cls):
+			if field[0] != "_" and field not in fields:
+				member = getattr(cls, field, None)
+				if not callable(member):
+					fields.add(field)
+		_schemas[key] = sorted(fields)
+	return _schemas[key]
 
 
 # callable was temporarily removed in Python 3.1... ugly hack to restore it
@@ -8,43 +8,201 @@ Implemented Algorithms:
 - Graph Search
   - uninformed Depth-First and Breadth-First Search
   - keeping track of visited Belief states
+  - Breadth-First Search can be parallelized over a number of processes
+  - Breadth-First Search can keep its layers on disk, for state spaces larger
+    than memory
 - Iterative Deepening Search
+- Informed Best-First Search
+  - A*, Weighted A*, and Greedy Best-First Search
+  - using the number of unfulfilled subgoals as default heuristics, or the
+    relaxed planning graph heuristics h_max, h_add, and h_FF
+- Anytime Beam Search
+  - returning the best plan found within a time or node budget, restarting
+    with wider beams to find shorter plans
+- Bidirectional Search
+  - Breadth-First Search forward from the Beliefs and backward from the goal,
+    regressing the goal through the Actions into partial states
+- Portfolio Planning, running several configurations in parallel processes
 - Serial Decomposition
-  - no backtracking yet; subgoals can be undone by plans for other goals
+  - optionally with backtracking over alternative subplans and orderings of
+    the subgoals, caching subplans and checking subgoals for interference
+- All of the above can also be done on a ground representation of the problem,
+  using bitmask states and operators (see grounding module)
+- Symmetry Reduction, pruning permutations of visited states with respect to
+  interchangeable objects (see symmetry module)
 
 To Do:
-- Serial Decomposition w/ backtracking
-- Informed Search, using the number of fulfilled subgoals as heuristics
-- Regression Search / Backward Chaining
 - Partial Order Planning
 """
 
 from knowledge import *
 from reasoning import *
-from collections import deque
+from grounding import GroundTask, GroundCondition, GroundOperator, expand_ground
+from heuristics import relaxed_heuristic, INFINITY
+from symmetry import Symmetry, terms
+from collections import deque, OrderedDict
+from queue import Empty
+import heapq
+import itertools
+import mmap
+import multiprocessing
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
 
 LOG_LEVEL = 2
 MAX_DEPTH = 64
+WEIGHT = 2
+TABLE_SIZE = 10000
+BUFFER_SIZE = 1000000
+BEAM_WIDTH = 8
+POLL = 0.1
 
 
-def search_plan(goal, beliefs, actions, serial_decomp=False, breadth_first=False):
+def search_plan(goal, beliefs, actions, serial_decomp=False, breadth_first=False,
+                ground=False, reorder=False, symmetry=False, backtrack=False, stats=None,
+                **options):
 	"""Search for a way to fulfill the goal Condition for the Beliefs using the
 	given Actions. Returns a sequence of tuples of actions and variable matches
 	of how the goal can be reached (which can also be an empty sequence) or None
-	if no way to reach the goal has been found.
+	if no way to reach the goal has been found. If ground is set, the problem
+	is compiled to a Ground Task first, and the search runs on the ground
+	states and operators. If reorder is set, the conjunctive preconditions of
+	the actions (and the goal, if not using Serial Decomposition) are reordered
+	by selectivity, estimated from the initial beliefs. If backtrack is set,
+	Serial Decomposition backtracks (see backtracking_decomposition). Further
+	options, such as the search strategy, are passed on to search. The
+	heuristic may also be given by name (hmax, hadd, or hff, see heuristics
+	module), in which case the relaxed planning graph for the problem is built
+	first. If symmetry is set, interchangeable objects are detected (see
+	symmetry module), and states that are permutations of visited states are
+	pruned, too.
+
+	If the strategy is "portfolio", a number of configurations of the planner
+	are run concurrently instead, see portfolio_plan.
+
+	If a Search Stats object is given, the statistics of the search are
+	collected in it; otherwise, a new one is used just for the log messages.
 	"""
-	global c, p; c, p = 0, 0
-	if serial_decomp:
-		plan = serial_decomposition(goal, beliefs, actions, breadth_first)
-	elif breadth_first:
-		plan = graph_search(goal, beliefs, actions, breadth_first)
+	if stats is None:
+		stats = SearchStats(timing=False)
+	if options.get("strategy") == "portfolio":
+		plan = portfolio_plan(goal, beliefs, actions, stats=stats, serial_decomp=serial_decomp,
+		                      breadth_first=breadth_first, ground=ground, reorder=reorder,
+		                      symmetry=symmetry, backtrack=backtrack, **options)
+		log(1, " %d planning steps until finished.", stats.expanded)
+		log(1, " %d pruned planning branches.", stats.pruned)
+		return plan
+	task = None
+	if symmetry:
+		symmetry = Symmetry(goal, beliefs, actions)
+		log(2, "Symmetric objects: %s", sorted(map(str, symmetry.free)))
+		options["symmetry"] = symmetry if len(symmetry) > 1 else None
+	if ground:
+		task = GroundTask(beliefs, actions)
+		if options.get("symmetry"):
+			options["symmetry"].ground(task)
+		goal = task.condition(goal, serial_decomp)
+		beliefs, actions = task.state, task.operators
+	else:
+		beliefs = BeliefBase(beliefs)
+		if reorder:
+			counts = cardinalities(beliefs)
+			reordered = [ Action(a.name, reorder_conjunction(a.pre, beliefs, counts), a.eff, a.impl)
+			              for a in actions ]
+			originals = dict((id(new), old) for (new, old) in zip(reordered, actions))
+			actions = reordered
+			if not serial_decomp:
+				goal = reorder_conjunction(goal, beliefs, counts)
+	if isinstance(options.get("heuristic"), str):
+		options["heuristic"] = relaxed_heuristic(options["heuristic"], beliefs, actions, task)
+	if serial_decomp and backtrack:
+		plan = backtracking_decomposition(goal, beliefs, actions, breadth_first, stats=stats,
+		                                  **options)
+	elif serial_decomp:
+		plan = serial_decomposition(goal, beliefs, actions, breadth_first, stats=stats, **options)
 	else:
-		plan = iterative_deepening_search(goal, beliefs, actions)
-	log(1, " %d planning steps until finished." % c)
-	log(1, " %d pruned planning branches." % p)
+		plan = search(goal, beliefs, actions, breadth_first, stats=stats, **options)
+	if ground and plan is not None:
+		plan = [ (op.action, match) for (op, match) in plan ]
+	elif reorder and plan is not None:
+		plan = [ (originals[id(a)], match) for (a, match) in plan ]
+	log(1, " %d planning steps until finished.", stats.expanded)
+	log(1, " %d pruned planning branches.", stats.pruned)
 	return plan
 
 
+def search(goal, beliefs, actions, breadth_first=False, strategy=None,
+           heuristic=None, weight=WEIGHT, stats=None, processes=None, symmetry=None,
+           directory=None, beam_width=BEAM_WIDTH, time_limit=None, max_nodes=None):
+	"""Search for a plan using the given strategy:
+	* "ids":    Iterative Deepening Search (default)
+	* "idastar": Iterative Deepening A*, using the heuristic
+	* "bfs":    Breadth-First Search (default, if breadth_first is set)
+	* "astar":  A* Search, using the heuristic
+	* "wastar": Weighted A* Search, using the heuristic times the weight
+	* "gbfs":   Greedy Best-First Search, using only the heuristic
+	* "bidirectional": Bidirectional Breadth-First Search
+	* "beam":   Anytime Beam Search, using the heuristic, with the beam width,
+	            returning the best plan found within the time limit (in seconds)
+	            or the maximum number of expanded nodes
+	The heuristic is a function of the goal and the beliefs, defaulting to the
+	defect of the goal, e.g. one of the relaxed planning graph heuristics.
+	If a number of processes is given, Breadth-First Search runs in parallel;
+	if a directory is given, it keeps the layers of the search on disk there.
+	If a Symmetry is given, it is used for checking visited states, except in
+	Bidirectional and parallel or external Breadth-First Search.
+	"""
+	if strategy is None:
+		strategy = "bfs" if breadth_first else "ids"
+	if strategy == "ids":
+		return iterative_deepening_search(goal, beliefs, actions, stats=stats,
+		                                  symmetry=symmetry)
+	if strategy == "idastar":
+		return iterative_deepening_search(goal, beliefs, actions, stats, heuristic or defect,
+		                                  symmetry=symmetry)
+	if strategy == "bfs":
+		return graph_search(goal, beliefs, actions, True, stats=stats, processes=processes,
+		                    symmetry=symmetry, directory=directory)
+	if strategy == "astar":
+		return best_first_search(goal, beliefs, actions, heuristic, stats=stats,
+		                         symmetry=symmetry)
+	if strategy == "wastar":
+		return best_first_search(goal, beliefs, actions, heuristic, weight, stats=stats,
+		                         symmetry=symmetry)
+	if strategy == "gbfs":
+		return best_first_search(goal, beliefs, actions, heuristic, greedy=True, stats=stats,
+		                         symmetry=symmetry)
+	if strategy == "beam":
+		return beam_search(goal, beliefs, actions, heuristic, beam_width, time_limit,
+		                   max_nodes, stats=stats, symmetry=symmetry)
+	if strategy == "bidirectional":
+		return bidirectional_search(goal, beliefs, actions, stats=stats)
+	raise ValueError("Unknown search strategy: %r" % strategy)
+
+
+def ground_search(function, goal, beliefs, actions, args=(), fallback=None):
+	"""Ground the problem and run the search function, e.g. Parallel Graph
+	Search, on the ground goal, state and operators, followed by the further
+	arguments, translating the plan back to Actions and matches. If the problem
+	can not be grounded, the fallback is called without arguments instead, if
+	given, or else the ValueError is raised.
+	"""
+	try:
+		task = GroundTask(beliefs, actions)
+		ground_goal = task.condition(goal)
+	except ValueError as e:
+		if fallback is None:
+			raise
+		log(2, "Can not ground problem, searching without grounding: %s", e)
+		return fallback()
+	plan = function(ground_goal, task.state, task.operators, *args)
+	return [ (op.action, match) for (op, match) in plan ] if plan is not None else None
+
+
 
 ################################################################################
 #                                                                              #
@@ -52,7 +210,7 @@ def search_plan(goal, beliefs, actions, serial_decomp=False, breadth_first=False
 #                                                                              #
 ################################################################################
 
-def serial_decomposition(goal, beliefs, actions, breadth_first=False):
+def serial_decomposition(goal, beliefs, actions, breadth_first=False, **options):
 	"""In Serial Decomposition Planning, a Conjunction of goals is split up into
 	several subgoals which are planned for one after another. If the goal is
 	stated such that the most important aspect, or what has to be done first, is
@@ -63,25 +221,275 @@ def serial_decomposition(goal, beliefs, actions, breadth_first=False):
 	This simple form does not backtrack, so it is necessary that a solution for
 	the first subgoal does always allow for a solution for the other subgoals,
 	and that no solution for a later subgoal undoes a former subgoal's solution!
+	See backtracking_decomposition for a variant without these restrictions.
 	"""
 	if isinstance(goal, And):
 		new_beliefs = beliefs
 		full_plan = []
 		for subgoal in goal.conditions:
-			log(2, "Planning for Subgoal %s" % str(subgoal))
-			plan = serial_decomposition(subgoal, new_beliefs, actions, breadth_first)
+			log(2, "Planning for Subgoal %s", subgoal)
+			plan = serial_decomposition(subgoal, new_beliefs, actions, breadth_first, **options)
 			if plan is not None:
 				for (action, match) in plan:
-					new_beliefs = update(new_beliefs, action.eff, match)
+					new_beliefs = successor(new_beliefs, action, match)
 				full_plan += plan
 			else:
 				return None
 		return full_plan
 	else:
-		if breadth_first:
-			return graph_search(goal, beliefs, actions, True)
-		else:
-			return iterative_deepening_search(goal, beliefs, actions)
+		return search(goal, beliefs, actions, breadth_first, **options)
+
+
+def backtracking_decomposition(goal, beliefs, actions, breadth_first=False, **options):
+	"""Serial Decomposition with backtracking. The subgoals of the Conjunction
+	are planned for one after another, as in Serial Decomposition, but if the
+	plan for a subgoal undoes one of the subgoals achieved before, another plan
+	is searched for, achieving the new subgoal together with the former ones.
+	If there is no such plan, or no plan for the remaining subgoals from the
+	resulting state, the search backtracks and tries the next subgoal instead,
+	i.e. other orderings of the subgoals. Only if no ordering works, the goal
+	is searched for as a whole, so no plan is lost by the decomposition.
+
+	Subplans are cached for each pair of (sub)goal and state, so they are not
+	searched for again when another ordering reaches the same state. Before
+	searching, the subgoals are checked for interference with the Actions:
+	subgoals no Action can undo can not be undone by later plans, so for those,
+	neither checking the resulting states nor protecting them is needed.
+	"""
+	subgoals = list(flatten(goal))
+	threats = Threats(actions)
+	undoable = [ threats.threatened(subgoal) for subgoal in subgoals ]
+	cache = {}
+	ids = BeliefIds()
+
+	def subplan(target, state):
+		key = (tuple(target), state_key(state, ids)[1])
+		if key not in cache:
+			log(2, "Planning for Subgoal %s", conjunction([ subgoals[i] for i in target ]))
+			cache[key] = search(conjunction([ subgoals[i] for i in target ]), state,
+			                    actions, breadth_first, **options)
+		return cache[key]
+
+	def solve(state, achieved, remaining):
+		if not remaining:
+			return []
+		protect = any(undoable[i] for i in achieved)
+		for i in remaining:
+			targets = [ [i], achieved + [i] ] if protect else [ [i] ]
+			for target in targets:
+				plan = subplan(target, state)
+				if plan is None:
+					continue
+				new_state = state
+				for (action, match) in plan:
+					new_state = successor(new_state, action, match)
+				if protect and not all(satisfied(subgoals[j], new_state) for j in achieved):
+					log(2, "Plan for Subgoal %s undoes former subgoals", subgoals[i])
+					continue
+				rest = solve(new_state, achieved + [i], [ j for j in remaining if j != i ])
+				if rest is not None:
+					return plan + rest
+		return None
+
+	plan = solve(beliefs, [], list(range(len(subgoals))))
+	if plan is None and len(subgoals) > 1:
+		log(2, "No decomposition found, planning for the whole goal")
+		plan = search(conjunction(subgoals), beliefs, actions, breadth_first, **options)
+	return plan
+
+
+def flatten(goal):
+	"""Generate the subgoals of the goal, recursively splitting Conjunctions."""
+	if isinstance(goal, And):
+		for condition in goal.conditions:
+			for subgoal in flatten(condition):
+				yield subgoal
+	else:
+		yield goal
+
+
+def conjunction(conditions):
+	"""Get the Conjunction of the conditions. For Ground Conditions, this is a
+	Ground Condition again, holding the consistent combinations of their
+	alternatives.
+	"""
+	if len(conditions) == 1:
+		return conditions[0]
+	if all(isinstance(c, GroundCondition) for c in conditions):
+		alternatives = [(0, 0)]
+		for condition in conditions:
+			alternatives = [ (p1 | p2, n1 | n2)
+			                 for (p1, n1) in alternatives
+			                 for (p2, n2) in condition.alternatives
+			                 if not (p1 | p2) & (n1 | n2) ]
+		return GroundCondition(alternatives)
+	return And(*conditions)
+
+
+class Threats:
+	"""Threats class.
+
+	Checks cheaply whether a condition may be undone by the Actions, i.e.
+	whether some Action removes a Belief the condition requires or adds one it
+	negates. For Ground Operators, this is checked using the union of their
+	add and delete bitmasks; for lifted Actions, it is checked on the level of
+	predicates, using the predicates their effects add and remove.
+	"""
+
+	def __init__(self, actions):
+		self.adds = 0
+		self.deletes = 0
+		self.added = set()
+		self.removed = set()
+		for action in actions:
+			if isinstance(action, GroundOperator):
+				self.adds |= action.add
+				self.deletes |= action.delete
+			else:
+				(added, removed) = split_effects(action.eff)
+				self.added.update(belief.pred for belief in added)
+				self.removed.update(belief.pred for belief in removed)
+
+	def threatened(self, condition):
+		"""Check whether the condition may be undone by one of the Actions."""
+		if isinstance(condition, GroundCondition):
+			return any(pos & self.deletes or neg & self.adds
+			           for (pos, neg) in condition.alternatives)
+		return any(pred in (self.added if negated else self.removed)
+		           for (pred, negated) in predicates(condition))
+
+
+
+################################################################################
+#                                                                              #
+#   PORTFOLIO PLANNING                                                         #
+#                                                                              #
+################################################################################
+
+PORTFOLIO = [ dict(serial_decomp=False, strategy="ids"),
+              dict(serial_decomp=False, strategy="bfs"),
+              dict(serial_decomp=True,  strategy="ids", backtrack=True),
+              dict(serial_decomp=True,  strategy="bfs", backtrack=True) ]
+
+def portfolio_plan(goal, beliefs, actions, portfolio=None, grace=0, stats=None,
+                   strategy=None, **options):
+	"""Run a portfolio of planner configurations concurrently, each in a
+	process of its own, and return the first plan found, or, if a grace period
+	(in seconds) is given, the shortest plan found until that much time after
+	the first one; the other processes are terminated then. The portfolio is a
+	list of dictionaries of options for search_plan, defaulting to PORTFOLIO,
+	i.e. Iterative Deepening and Breadth-First Search, with and without Serial
+	Decomposition (with backtracking); further options are used for all the
+	configurations. The processes do not log, and the search statistics of
+	those that have finished are summed up. Processes failing with an error,
+	or dying, count as finished without a plan. Plans that do not achieve the
+	goal, e.g. found by Serial Decomposition without backtracking, are
+	discarded, too.
+
+	The plans are sent back with the actions and the values of the matches
+	given by their positions in the actions, and in the Beliefs and Actions,
+	so that the plan refers to the very same objects as the problem.
+	"""
+	stats = stats or SearchStats(timing=False)
+	portfolio = portfolio or PORTFOLIO
+	configurations = [ dict(options, **config) for config in portfolio ]
+	values = plan_values(goal, beliefs, actions)
+	context = process_context()
+	results = context.Queue()
+	members = [ context.Process(target=_portfolio_member,
+	                            args=(i, goal, beliefs, actions, config, results))
+	            for (i, config) in enumerate(configurations) ]
+	for member in members:
+		member.start()
+	try:
+		best = None
+		deadline = None
+		pending = list(members)
+		while pending:
+			timeout = max(0, deadline - time.time()) if deadline is not None else None
+			try:
+				(i, encoded, counts, error) = receive(results, pending, timeout)
+			except Empty:
+				break
+			except multiprocessing.ProcessError as e:
+				# members that died without sending a result, e.g. being killed
+				for member in e.args:
+					log(2, "Configuration %s died with exit code %d",
+					    portfolio[members.index(member)], member.exitcode)
+					pending.remove(member)
+				continue
+			pending.remove(members[i])
+			if error is not None:
+				log(2, "Configuration %s failed: %s", portfolio[i], error)
+			stats.expanded += counts["expanded"]
+			stats.generated += counts["generated"]
+			stats.pruned += counts["pruned"]
+			stats.max_fringe = max(stats.max_fringe, counts["max_fringe"])
+			if encoded is not None:
+				plan = decode_plan(encoded, actions, values)
+				if not achieves(goal, beliefs, plan):
+					log(2, "Invalid plan of length %d found with %s", len(plan), portfolio[i])
+					continue
+				log(2, "Plan of length %d found with %s", len(plan), portfolio[i])
+				if best is None or len(plan) < len(best):
+					best = plan
+				if deadline is None:
+					deadline = time.time() + grace
+		return best
+	finally:
+		for member in members:
+			if member.is_alive():
+				member.terminate()
+			member.join()
+
+
+def _portfolio_member(index, goal, beliefs, actions, config, results):
+	global LOG_LEVEL
+	LOG_LEVEL = 0
+	stats = SearchStats(timing=False)
+	try:
+		plan = search_plan(goal, beliefs, actions, stats=stats, **config)
+		encoded = encode_plan(plan, actions, plan_values(goal, beliefs, actions))
+		result = (index, encoded, stats.as_dict(), None)
+	except Exception as e:
+		result = (index, None, stats.as_dict(), "%s: %s" % (type(e).__name__, e))
+	results.put(result)
+
+
+def plan_values(goal, beliefs, actions):
+	"""Get the list of values matches may refer to, i.e. the subjects and
+	objects of the Beliefs and the constants of the goal and the Actions.
+	"""
+	values = []
+	for belief in beliefs:
+		values += [ belief.subj, belief.obj ]
+	for condition in [goal] + [ c for a in actions for c in (a.pre, a.eff) ]:
+		values += terms(condition)
+	return values
+
+
+def encode_plan(plan, actions, values):
+	"""Encode the plan for sending it to another process, replacing each Action
+	by its position in the actions and each value of the matches found in the
+	values by its position there, too.
+	"""
+	if plan is None:
+		return None
+	positions = {}
+	for (i, value) in enumerate(values):
+		positions.setdefault(id(value), i)
+	indices = dict((id(action), i) for (i, action) in enumerate(actions))
+	return [ (indices[id(action)],
+	          dict((var, (True, positions[id(value)]) if id(value) in positions
+	                     else (False, value)) for (var, value) in match.items()))
+	         for (action, match) in plan ]
+
+
+def decode_plan(encoded, actions, values):
+	"""Decode the plan encoded by encode_plan."""
+	return [ (actions[a], dict((var, values[value] if known else value)
+	                           for (var, (known, value)) in match.items()))
+	         for (a, match) in encoded ]
 
 
 
@@ -91,19 +499,102 @@ def serial_decomposition(goal, beliefs, actions, breadth_first=False):
 #                                                                              #
 ################################################################################
 
-def iterative_deepening_search(goal, beliefs, actions):
+def iterative_deepening_search(goal, beliefs, actions, stats=None, heuristic=None,
+                               table_size=None, symmetry=None):
 	"""Iterative Deepening Search calls a restricted depth-first search with 
 	increasing depth, until a plan is found or MAX_DEPTH is reached.
+
+	Instead of starting from scratch in each iteration, a Transposition Table
+	is kept across iterations, holding for each Belief state its cached
+	expansion, i.e. the actions and matches applicable there and the keys of
+	the successor states, and a lower bound for the length of the plan still
+	needed from there, which is raised whenever a state has been searched
+	without success. The successor states themselves are not kept, but computed
+	again from the cached expansion only when they are searched, keeping the
+	table small. States whose bound exceeds the remaining
+	depth are cut off, and the next iteration's depth is the smallest depth
+	cut off in this one, so depths known to be too short are skipped.
+
+	If a heuristic is given, it is used as initial lower bound, making this
+	Iterative Deepening A* (IDA*); with an inadmissible heuristic, the plan
+	found is not necessarily the shortest one. The size of the table defaults
+	to TABLE_SIZE. A Symmetry, if given, is used for the visited states of each
+	iteration only; the table holds the exact states.
 	"""
-	for i in range(1, MAX_DEPTH):
-		log(2, "Searching for a plan with length %d" % i)
-		plan = graph_search(goal, beliefs, actions, False, i)
-		if plan is not None:
-			return plan
+	stats = stats or SearchStats(timing=False)
+	heuristic = heuristic or (lambda goal, beliefs: 0)
+	table = TranspositionTable(table_size)
+	bound = 1
+	while bound < MAX_DEPTH:
+		log(2, "Searching for a plan with length %d", bound)
+		visited = VisitedStore(symmetry, table.ids)
+		visited.check(beliefs)
+		root = table.lookup(beliefs, goal, heuristic)
+		(node, bound) = bounded_search(goal, SearchNode(beliefs), root, actions, bound,
+		                               heuristic, table, visited, stats)
+		if node is not None:
+			log_visited(table)
+			return node.plan()
 	# no plan found
+	log_visited(table)
 	return None
 
 
+def bounded_search(goal, node, entry, actions, bound, heuristic, table, visited, stats,
+                   fringe=0):
+	"""Restricted Depth-First Search used by Iterative Deepening Search, from the
+	Search Node with the given entry of the Transposition Table. Within the
+	iteration, visited states are kept track of just like in Graph Search.
+	Returns a tuple of the goal node found, if any, and the smallest depth
+	exceeding the bound at which a state has been cut off. The fringe is the
+	number of successors of the node's ancestors still to be searched.
+	"""
+	stats.expansion(fringe)
+	if satisfied(goal, node.state, stats):
+		return (node, None)
+
+	# expand current belief state, or reuse expansion of former iteration, in
+	# which case the successor states are computed again only when needed
+	if entry.successors is None:
+		successors = [ (action, match, table.key(new_beliefs), new_beliefs)
+		               for (action, match, new_beliefs) in expand(node.state, actions, stats) ]
+		entry.successors = [ (action, match, key) for (action, match, key, s) in successors ]
+	else:
+		successors = [ (action, match, key, None) for (action, match, key) in entry.successors ]
+		if visited.symmetry is not None:
+			successors = [ (action, match, key, successor(node.state, action, match))
+			               for (action, match, key, s) in successors ]
+
+	# mark all new successors as visited before descending into any of them
+	successors = [ (action, match, key, new_beliefs)
+	               for (action, match, key, new_beliefs) in reversed(successors)
+	               if check_visited(new_beliefs, visited, node.depth, stats, key) ]
+
+	next_bound = INFINITY
+	for (i, (action, match, key, new_beliefs)) in enumerate(successors):
+		child = table.get(key)
+		if child is None:
+			if new_beliefs is None:
+				new_beliefs = successor(node.state, action, match)
+			child = table.lookup(new_beliefs, goal, heuristic, key)
+		f = node.depth + 1 + child.h
+		if f > bound:
+			next_bound = min(next_bound, f)
+			continue
+		if new_beliefs is None:
+			new_beliefs = successor(node.state, action, match)
+		item = SearchNode(new_beliefs, action, match, node)
+		(found, b) = bounded_search(goal, item, child, actions, bound, heuristic,
+		                            table, visited, stats, fringe + len(successors) - i - 1)
+		if found is not None:
+			return (found, None)
+		next_bound = min(next_bound, b)
+
+	# no plan within the bound from here; remember for next iterations
+	entry.h = max(entry.h, bound - node.depth + 1)
+	return (None, next_bound)
+
+
 
 ################################################################################
 #                                                                              #
@@ -111,7 +602,8 @@ def iterative_deepening_search(goal, beliefs, actions):
 #                                                                              #
 ################################################################################
 
-def graph_search(goal, beliefs, actions, breadth_first=True, max_depth=MAX_DEPTH):
+def graph_search(goal, beliefs, actions, breadth_first=True, max_depth=MAX_DEPTH,
+                 stats=None, processes=None, symmetry=None, directory=None):
 	"""Uninformed Restricted Depth Graph Search. Keeps track of visited Belief
 	states and the length of the plans needed to go there. If a new plan reaches
 	a Belief state that has already been achieved with another plan of smaller
@@ -121,44 +613,690 @@ def graph_search(goal, beliefs, actions, breadth_first=True, max_depth=MAX_DEPTH
 	have their strengths and weaknesses. Breadth-First Search can be very fast,
 	if the Belief space is limited (as in the Towers of Hanoi case). Depth-First
 	Search should be used only in the form of Iterative Deepening Search.
+
+	If a number of processes (greater than one) is given, Breadth-First Search
+	is done by Parallel Graph Search instead; if a directory is given, it is
+	done by External Graph Search, keeping the layers of the search in files
+	in that directory. If a Symmetry is given, it is used for checking visited
+	states (see VisitedStore).
 	"""
-	global c
-	visited = {}
+	stats = stats or SearchStats(timing=False)
+	if breadth_first and directory is not None:
+		return external_graph_search(goal, beliefs, actions, directory, max_depth, stats)
+	if breadth_first and processes and processes > 1:
+		return parallel_graph_search(goal, beliefs, actions, processes, max_depth, stats)
+	visited = VisitedStore(symmetry)
 	fringe = deque()
-	fringe.append(([], beliefs)) # ([(action, match)*], beliefs)
+	fringe.append(SearchNode(beliefs))
 	
 	last = 0
 	while fringe:
-		c += 1
-		(plan, beliefs) = fringe.pop()
+		stats.expansion(len(fringe))
+		node = fringe.pop()
 		
 		# check plan length (only for DFS)
-		if breadth_first and len(plan) > last:
-			log(2, "Searching for a plan with length %d" % len(plan))
-			last = len(plan)
+		if breadth_first and node.depth > last:
+			log(2, "Searching for a plan with length %d", node.depth)
+			last = node.depth
 		
 		# test whether the goal is fulfilled
-		if find_matches(goal, beliefs):
-			return plan
+		if satisfied(goal, node.state, stats):
+			log_visited(visited)
+			return node.plan()
 		
 		# continue search?
-		if max_depth == None or len(plan) < max_depth:
+		if max_depth == None or node.depth < max_depth:
 		
-			# expand current belief state with applicable actions
-			for (action, match, new_beliefs) in expand(beliefs, actions):
+			# expand current belief state with applicable actions; the state is
+			# not needed for the plan, so the node does not keep it any longer
+			(state, node.state) = (node.state, None)
+			for (action, match, new_beliefs) in expand(state, actions, stats):
 
 				# continue search with this plan if the new beliefs are really new
-				if check_visited(new_beliefs, visited, len(plan)):
-					item = (plan + [(action, match)], new_beliefs)
+				if check_visited(new_beliefs, visited, node.depth, stats):
+					item = SearchNode(new_beliefs, action, match, node)
 					if breadth_first:
 						fringe.appendleft(item)
 					else:
 						fringe.append(item)
 	# nothing found 
+	log_visited(visited)
 	return None
 	
 
 
+################################################################################
+#                                                                              #
+#   PARALLEL GRAPH SEARCH                                                      #
+#                                                                              #
+################################################################################
+
+def parallel_graph_search(goal, beliefs, actions, processes, max_depth=MAX_DEPTH,
+                          stats=None):
+	"""Breadth-First Graph Search, expanding each layer of the search in parallel
+	using a number of worker processes. Each state is owned by one worker,
+	determined by the state's hash; only the owner keeps track of whether the
+	state has been visited, and the parent state and operator leading to it.
+	In each step, each worker checks the states it has been sent for being new
+	and fulfilling the goal, then expands the new ones and sends each successor
+	directly to its owner. The main process only synchronizes the layers and
+	finally reconstructs the plan by asking the owners for the parents. If a
+	worker dies, e.g. running out of memory, a Process Error is raised.
+
+	States are exchanged in their ground encoding, i.e. as integers, and
+	operators by their index, so unless the beliefs are a ground state already,
+	the problem is grounded first. If it can not be grounded, the search falls
+	back to sequential Breadth-First Search.
+	"""
+	stats = stats or SearchStats(timing=False)
+	if not isinstance(beliefs, int):
+		return ground_search(parallel_graph_search, goal, beliefs, actions,
+		                     (processes, max_depth, stats),
+		                     lambda: graph_search(goal, beliefs, actions, True, max_depth, stats))
+
+	context = process_context()
+	inboxes = [ context.Queue() for i in range(processes) ]
+	controls = [ context.Queue() for i in range(processes) ]
+	results = context.Queue()
+	workers = [ context.Process(target=_parallel_worker,
+	                            args=(i, goal, actions, inboxes, controls[i], results))
+	            for i in range(processes) ]
+	for worker in workers:
+		worker.start()
+	try:
+		# send initial state to its owner, and nothing to all others
+		for (i, inbox) in enumerate(inboxes):
+			for j in range(processes):
+				inbox.put([(beliefs, None, None)] if i == j == owner(beliefs, processes) else [])
+
+		for depth in range(max_depth + 1):
+			if depth > 0:
+				log(2, "Searching for a plan with length %d", depth)
+			replies = [ receive(results, workers) for i in range(processes) ]
+			found = [ state for (i, state, new, generated) in replies if state is not None ]
+			new = sum(reply[2] for reply in replies)
+			stats.generated += sum(reply[3] for reply in replies)
+			stats.max_fringe = max(stats.max_fringe, new)
+			if found:
+				return parallel_plan(found[0], actions, controls, results, workers)
+			if new == 0 or depth == max_depth:
+				return None
+			for control in controls:
+				control.put(("expand", None))
+			stats.expanded += new
+		return None
+	finally:
+		for control in controls:
+			control.put(None)
+		for worker in workers:
+			worker.join(1)
+			if worker.is_alive():
+				worker.terminate()
+
+
+def parallel_plan(state, operators, controls, results, workers):
+	"""Reconstruct the plan leading to the state from the parents kept by the
+	workers of Parallel Graph Search.
+	"""
+	plan = []
+	while True:
+		controls[owner(state, len(controls))].put(("parent", state))
+		(parent, o) = receive(results, workers)
+		if parent is None:
+			break
+		plan.append((operators[o], operators[o].match))
+		state = parent
+	plan.reverse()
+	return plan
+
+
+def _parallel_worker(index, goal, operators, inboxes, control, results):
+	visited = {}
+	frontier = []
+	while True:
+		# receive states from all workers, and report new states to main process
+		received = [ inboxes[index].get() for i in range(len(inboxes)) ]
+		frontier = []
+		found = None
+		generated = 0
+		for batch in received:
+			generated += len(batch)
+			for (state, parent, o) in batch:
+				if state not in visited:
+					visited[state] = (parent, o)
+					frontier.append(state)
+					if found is None and goal.satisfied(state):
+						found = state
+		results.put((index, found, len(frontier), generated))
+
+		# wait for orders: expand the new states, look up parents, or stop
+		while True:
+			order = control.get()
+			if order is None:
+				return
+			(command, state) = order
+			if command == "parent":
+				results.put(visited[state])
+			elif command == "expand":
+				break
+		batches = [ {} for inbox in inboxes ]
+		for state in frontier:
+			for (o, op) in enumerate(operators):
+				if op.pre.satisfied(state):
+					new_state = op.apply(state)
+					batch = batches[owner(new_state, len(inboxes))]
+					if new_state not in batch and new_state not in visited:
+						batch[new_state] = (new_state, state, o)
+		for (inbox, batch) in zip(inboxes, batches):
+			inbox.put(list(batch.values()))
+
+
+def owner(state, processes):
+	"""Get the index of the process owning the ground state."""
+	return hash(state) % processes
+
+
+def process_context():
+	"""Get the multiprocessing context for starting processes, preferring the
+	fork start method, so that the problem does not have to be pickled.
+	"""
+	if "fork" in multiprocessing.get_all_start_methods():
+		return multiprocessing.get_context("fork")
+	return multiprocessing.get_context()
+
+
+def receive(queue, processes, timeout=None):
+	"""Get the next item from the queue the processes put their items into,
+	waiting at most timeout seconds, or forever if None, and raising Empty if
+	there is no item in time. While waiting, the processes are checked every
+	POLL seconds, and if some of them have terminated, but there still is no
+	item, a Process Error is raised, with the terminated processes as args.
+	"""
+	deadline = time.time() + timeout if timeout is not None else None
+	while True:
+		terminated = [ process for process in processes if process.exitcode is not None ]
+		wait = POLL if deadline is None else max(0, min(POLL, deadline - time.time()))
+		try:
+			return queue.get(timeout=wait)
+		except Empty:
+			# terminated processes have flushed their items before, so none is coming
+			if terminated:
+				raise multiprocessing.ProcessError(*terminated)
+			if deadline is not None and time.time() >= deadline:
+				raise
+
+
+
+################################################################################
+#                                                                              #
+#   EXTERNAL GRAPH SEARCH                                                      #
+#                                                                              #
+################################################################################
+
+def external_graph_search(goal, beliefs, actions, directory, max_depth=MAX_DEPTH,
+                          stats=None):
+	"""Breadth-First Graph Search keeping the layers of the search on disk
+	instead of in memory, so that much larger state spaces can be searched.
+	Each layer is written to a Layer File, sorted by state, with the parent and
+	operator of each state. The successors of a layer are collected in memory
+	up to BUFFER_SIZE states at a time, sorted and written to run files, which
+	are then merged into the next layer, dropping duplicates as well as states
+	contained in one of the previous layers, by merging against those, too.
+	The plan is reconstructed by following the parent records back through
+	the layers.
+
+	Like Parallel Graph Search, this works on ground states, so unless the
+	beliefs are a ground state already, the problem is grounded first, falling
+	back to sequential Breadth-First Search if it can not be grounded. The
+	files are kept in a temporary directory within the given directory, which
+	is removed afterwards.
+	"""
+	stats = stats or SearchStats(timing=False)
+	if not isinstance(beliefs, int):
+		return ground_search(external_graph_search, goal, beliefs, actions,
+		                     (directory, max_depth, stats),
+		                     lambda: graph_search(goal, beliefs, actions, True, max_depth, stats))
+
+	index = dict((id(op), o) for (o, op) in enumerate(actions))
+	path = tempfile.mkdtemp(prefix="search-", dir=directory)
+	layers = []
+	try:
+		layers.append(LayerFile(os.path.join(path, "layer-0"), [(beliefs, 0, 0)],
+		                        state_width([beliefs])))
+		for depth in range(max_depth + 1):
+			if depth > 0:
+				log(2, "Searching for a plan with length %d", depth)
+			layer = layers[-1]
+			runs = []
+			buffer = {}
+			for (i, (state, parent, o)) in enumerate(layer):
+				stats.expansion(len(layer) - i)
+				if satisfied(goal, state, stats):
+					return external_plan(layers, i, actions)
+				if depth == max_depth:
+					continue
+				for (op, match, new_state) in expand(state, actions, stats):
+					if new_state in buffer:
+						stats.pruned += 1
+					else:
+						buffer[new_state] = (new_state, i, index[id(op)])
+				if len(buffer) >= BUFFER_SIZE:
+					runs.append(write_run(path, len(runs), buffer))
+					buffer = {}
+			if depth == max_depth:
+				break
+			if buffer or not runs:
+				runs.append(write_run(path, len(runs), buffer))
+			width = max(run.width for run in runs)
+			layer = LayerFile(os.path.join(path, "layer-%d" % (depth + 1)),
+			                  merge_layers(runs, layers, stats), width)
+			for run in runs:
+				run.close()
+				os.remove(run.filename)
+			if len(layer) == 0:
+				layer.close()
+				return None
+			layers.append(layer)
+		return None
+	finally:
+		for layer in layers:
+			layer.close()
+		shutil.rmtree(path, ignore_errors=True)
+
+
+def write_run(path, number, buffer):
+	"""Write the buffered successor records to a new run file, sorted."""
+	return LayerFile(os.path.join(path, "run-%d" % number), sorted(buffer.values()),
+	                 state_width(buffer))
+
+
+def merge_layers(runs, layers, stats=None):
+	"""Merge the sorted runs into one sorted sequence of records, dropping
+	duplicate states and states already contained in one of the layers.
+	"""
+	old = heapq.merge(*[ layer.states() for layer in layers ])
+	seen = next(old, None)
+	last = None
+	for record in heapq.merge(*runs):
+		state = record[0]
+		while seen is not None and seen < state:
+			seen = next(old, None)
+		if state == last or state == seen:
+			if stats:
+				stats.pruned += 1
+			continue
+		last = state
+		yield record
+
+
+def external_plan(layers, i, operators):
+	"""Reconstruct the plan leading to the i-th state of the last layer from
+	the parent records in the Layer Files of External Graph Search.
+	"""
+	plan = []
+	for layer in reversed(layers[1:]):
+		(state, parent, o) = layer[i]
+		plan.append((operators[o], operators[o].match))
+		i = parent
+	plan.reverse()
+	return plan
+
+
+def state_width(states):
+	"""Get the number of bytes needed for storing the largest of the states."""
+	return max([ (state.bit_length() + 7) // 8 for state in states ] + [1])
+
+
+class LayerFile:
+	"""Layer File class.
+
+	A file of fixed-size records, each holding a ground state, the index of
+	its parent in the previous layer, and the index of the operator leading
+	there, as used by External Graph Search. States are stored as big-endian
+	integers of the given width in bytes, followed by parent and operator as
+	four-byte integers. The file is written from an iterable of records in
+	one go, and memory-mapped for reading afterwards, so that records can be
+	iterated in order as well as looked up by index.
+	"""
+
+	RECORD = struct.Struct(">II")
+
+	def __init__(self, filename, records, width):
+		self.filename = filename
+		self.width = width
+		self.size = width + self.RECORD.size
+		self.count = 0
+		with open(filename, "wb") as f:
+			chunk = bytearray()
+			for (state, parent, o) in records:
+				chunk += state.to_bytes(width, "big")
+				chunk += self.RECORD.pack(parent, o)
+				self.count += 1
+				if len(chunk) >= 1 << 20:
+					f.write(chunk)
+					chunk = bytearray()
+			f.write(chunk)
+		self.file = open(filename, "rb")
+		self.map = None
+		if self.count:
+			self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+	def __len__(self):
+		return self.count
+
+	def __getitem__(self, i):
+		start = i * self.size
+		state = int.from_bytes(self.map[start:start + self.width], "big")
+		return (state,) + self.RECORD.unpack_from(self.map, start + self.width)
+
+	def __iter__(self):
+		for i in range(self.count):
+			yield self[i]
+
+	def states(self):
+		"""Iterate the states of the file, in order."""
+		for i in range(self.count):
+			start = i * self.size
+			yield int.from_bytes(self.map[start:start + self.width], "big")
+
+	def close(self):
+		if self.map is not None:
+			self.map.close()
+			self.map = None
+		self.file.close()
+
+
+
+################################################################################
+#                                                                              #
+#   BEST-FIRST SEARCH                                                          #
+#                                                                              #
+################################################################################
+
+def best_first_search(goal, beliefs, actions, heuristic=None, weight=1,
+                      greedy=False, max_depth=MAX_DEPTH, stats=None, symmetry=None):
+	"""Informed Best-First Graph Search. The fringe is a priority queue ordered
+	by the length of the plan (g) plus the heuristic estimate of the remaining
+	plan's length (h) times the weight. With a weight of One, this is A* Search,
+	with a greater weight it is Weighted A* Search, which will usually find
+	plans faster, but possibly longer ones. If greedy is set, only h is used,
+	making it a Greedy Best-First Search. Ties are broken by preferring lower h,
+	and then by the order in which the nodes were added.
+
+	The heuristic is a function of the goal and the beliefs, defaulting to the
+	defect. Visited Belief states are kept track of just like in Graph Search,
+	using the Symmetry, if given.
+	"""
+	stats = stats or SearchStats(timing=False)
+	heuristic = heuristic or defect
+	visited = VisitedStore(symmetry)
+	fringe = []
+	counter = itertools.count()
+	h = heuristic(goal, beliefs)
+	heapq.heappush(fringe, (weight * h, h, next(counter), SearchNode(beliefs)))
+
+	while fringe:
+		stats.expansion(len(fringe))
+		(f, h, n, node) = heapq.heappop(fringe)
+
+		# test whether the goal is fulfilled
+		if satisfied(goal, node.state, stats):
+			log_visited(visited)
+			return node.plan()
+
+		# continue search?
+		if max_depth == None or node.depth < max_depth:
+
+			# expand current belief state with applicable actions; the state is
+			# not needed for the plan, so the node does not keep it any longer
+			(state, node.state) = (node.state, None)
+			for (action, match, new_beliefs) in expand(state, actions, stats):
+
+				# add to fringe, ordered by g + w * h, if the beliefs are new
+				if check_visited(new_beliefs, visited, node.depth, stats):
+					h = heuristic(goal, new_beliefs)
+					g = 0 if greedy else node.depth + 1
+					item = SearchNode(new_beliefs, action, match, node)
+					heapq.heappush(fringe, (g + weight * h, h, next(counter), item))
+	# nothing found
+	log_visited(visited)
+	return None
+
+
+
+################################################################################
+#                                                                              #
+#   BEAM SEARCH                                                                #
+#                                                                              #
+################################################################################
+
+def beam_search(goal, beliefs, actions, heuristic=None, width=BEAM_WIDTH,
+                time_limit=None, max_nodes=None, max_depth=MAX_DEPTH, stats=None,
+                symmetry=None):
+	"""Anytime Beam Search. Searches layer by layer like Breadth-First Search,
+	but keeps only the best nodes of each layer, i.e. those with the lowest
+	heuristic value, up to the beam width. Once a plan has been found, the
+	search is restarted with twice the beam width, looking for shorter plans
+	only, and so on, until the time limit (in seconds) or the maximum number
+	of expanded nodes is reached, in which case the best plan found so far is
+	returned, or until a search has not dropped any nodes from the beam, i.e.
+	it has been a complete Breadth-First Search, so the plan is the shortest.
+	If no plan has been found in a search, it is restarted with a wider beam,
+	too, as long as nodes have been dropped.
+
+	The heuristic is a function of the goal and the beliefs, defaulting to the
+	defect. Visited Belief states are kept track of in each search just like
+	in Graph Search.
+	"""
+	stats = stats or SearchStats(timing=False)
+	heuristic = heuristic or defect
+	deadline = time.time() + time_limit if time_limit is not None else None
+	budget = stats.expanded + max_nodes if max_nodes is not None else None
+	def exhausted():
+		return ((deadline is not None and time.time() >= deadline) or
+		        (budget is not None and stats.expanded >= budget))
+
+	best = None
+	while not exhausted():
+		log(2, "Searching for a plan with beam width %d", width)
+		limit = len(best) - 1 if best is not None else max_depth
+		(plan, complete) = beam_pass(goal, beliefs, actions, heuristic, width, limit,
+		                             exhausted, stats, symmetry)
+		if plan is not None:
+			log(2, "Found plan with length %d", len(plan))
+			best = plan
+		if complete:
+			break
+		width *= 2
+	return best
+
+
+def beam_pass(goal, beliefs, actions, heuristic, width, limit, exhausted, stats,
+              symmetry=None):
+	"""Do a single Beam Search with the given beam width for a plan no longer
+	than the limit, stopping early when the budget is exhausted. Returns the
+	plan, or None, and whether the search has been complete, i.e. no nodes
+	have been dropped from the beam.
+	"""
+	visited = VisitedStore(symmetry)
+	visited.check(beliefs)
+	layer = [ SearchNode(beliefs) ]
+	counter = itertools.count()
+	complete = True
+	while layer:
+		successors = []
+		for node in layer:
+			if exhausted():
+				return (None, False)
+			stats.expansion(len(layer))
+
+			# test whether the goal is fulfilled
+			if satisfied(goal, node.state, stats):
+				return (node.plan(), complete)
+
+			# continue search?
+			if node.depth < limit:
+				(state, node.state) = (node.state, None)
+				for (action, match, new_beliefs) in expand(state, actions, stats):
+					if check_visited(new_beliefs, visited, node.depth, stats):
+						h = heuristic(goal, new_beliefs)
+						item = SearchNode(new_beliefs, action, match, node)
+						successors.append((h, next(counter), item))
+
+		# keep only the best successors, ordered by heuristic value
+		successors.sort()
+		if len(successors) > width:
+			complete = False
+			stats.pruned += len(successors) - width
+			successors = successors[:width]
+		layer = [ item for (h, n, item) in successors ]
+	return (None, complete)
+
+
+
+################################################################################
+#                                                                              #
+#   BIDIRECTIONAL SEARCH                                                       #
+#                                                                              #
+################################################################################
+
+def bidirectional_search(goal, beliefs, actions, stats=None, max_depth=MAX_DEPTH):
+	"""Bidirectional Breadth-First Search. One search goes forward from the
+	Beliefs, just like Graph Search, while the other goes backward from the goal,
+	regressing it through the Actions: The nodes of the backward search are
+	partial states, i.e. sets of Beliefs that have to hold and that must not
+	hold, such that the goal can be reached from each state matching them. The
+	search stops as soon as a state of the forward search matches a partial
+	state of the backward search. In each step, the smaller of the two fringes
+	is expanded by one full layer, so that the plan found is a shortest one.
+
+	Regression works on the ground representation of the problem, so unless
+	the beliefs are a ground state already, the problem is grounded first,
+	falling back to (unidirectional) Breadth-First Search if it can not be
+	grounded.
+	"""
+	stats = stats or SearchStats(timing=False)
+	if not isinstance(beliefs, int):
+		return ground_search(bidirectional_search, goal, beliefs, actions, (stats, max_depth),
+		                     lambda: graph_search(goal, beliefs, actions, True, max_depth, stats))
+
+	forward = {beliefs: SearchNode(beliefs)}
+	backward = {}
+	for partial in goal.alternatives:
+		if not partial[0] & partial[1]:
+			backward[partial] = SearchNode(partial)
+	forward_layer = list(forward.values())
+	backward_layer = list(backward.values())
+	best = meeting(forward_layer, backward_layer)
+
+	while (best is None and forward_layer and backward_layer
+	       and forward_layer[0].depth + backward_layer[0].depth < max_depth):
+		if len(forward_layer) <= len(backward_layer):
+			log(2, "Searching forward with length %d", forward_layer[0].depth + 1)
+			forward_layer = expand_layer(forward_layer, forward, actions, stats)
+			best = meeting(forward_layer, backward.values())
+		else:
+			log(2, "Searching backward with length %d", backward_layer[0].depth + 1)
+			backward_layer = expand_layer(backward_layer, backward, actions, stats, True)
+			best = meeting(forward.values(), backward_layer)
+
+	if best is None:
+		return None
+	# join forward plan and backward plan, which is in the right order already
+	(node, partial) = best
+	plan = node.plan()
+	while partial.parent is not None:
+		plan.append((partial.action, partial.match))
+		partial = partial.parent
+	return plan
+
+
+def expand_layer(layer, nodes, operators, stats, backward=False):
+	"""Expand the layer of Search Nodes by one step forward or backward, adding
+	the new nodes to the dictionary of nodes of this search direction, and
+	return the new layer.
+	"""
+	new_layer = []
+	for node in layer:
+		stats.expansion(len(layer) + len(new_layer))
+		if backward:
+			successors = [ (op, op.match, partial) for op in operators
+			                                       for partial in regress(node.state, op) ]
+			for (op, match, partial) in successors:
+				stats.generation(op.action)
+		else:
+			successors = expand(node.state, operators, stats)
+		for (op, match, state) in successors:
+			if state in nodes:
+				stats.pruned += 1
+				continue
+			nodes[state] = SearchNode(state, op, match, node)
+			new_layer.append(nodes[state])
+	return new_layer
+
+
+def meeting(states, partials):
+	"""Find the pair of forward Search Node and backward Search Node with the
+	shortest combined plan length, such that the ground state of the former
+	matches the partial state of the latter, or None if there is no such pair.
+
+	Instead of comparing each state with each partial state, the partial states
+	are indexed by one of their positive Beliefs that does not hold in all of
+	the states, so that each state is compared only with the partial states
+	whose key Belief it holds, or that have none. Partial states that can not
+	match any of the states, requiring Beliefs that hold in none of them or
+	forbidding Beliefs that hold in all of them, are not indexed at all.
+	"""
+	states = list(states)
+	if not states:
+		return None
+	common = union = states[0].state
+	for node in states:
+		common &= node.state
+		union |= node.state
+	index = {}
+	for partial in partials:
+		(pos, neg) = partial.state
+		if pos & ~union or neg & common:
+			continue
+		varying = pos & ~common
+		index.setdefault(varying & -varying, []).append(partial)
+
+	best = None
+	for node in states:
+		for (key, group) in index.items():
+			if node.state & key != key:
+				continue
+			for partial in group:
+				(pos, neg) = partial.state
+				if node.state & pos == pos and not node.state & neg:
+					if best is None or node.depth + partial.depth < best[0].depth + best[1].depth:
+						best = (node, partial)
+	return best
+
+
+def regress(partial, op):
+	"""Regress the partial state, a tuple of bitmasks of Beliefs that have to
+	hold and that must not hold, through the Ground Operator, returning the
+	partial states from which the operator leads to the given partial state, one
+	for each alternative of the operator's precondition. The operator has to
+	contribute to the partial state, and must not contradict it.
+	"""
+	(pos, neg) = partial
+	if not (op.add & pos or op.delete & neg):
+		return []
+	if op.add & neg or op.delete & pos:
+		return []
+	result = []
+	for (pre_pos, pre_neg) in op.pre.alternatives:
+		new_pos = (pos & ~op.add) | pre_pos
+		new_neg = (neg & ~op.delete) | pre_neg
+		if not new_pos & new_neg:
+			result.append((new_pos, new_neg))
+	return result
+
+
+
 ################################################################################
 #                                                                              #
 #   HELPER FUNCTIONS                                                           #
@@ -169,10 +1307,15 @@ def defect(goal, beliefs, negation=False):
 	"""Get the defect of the goal condition in the given belief base. The defect
 	for a Belief is One if the Belief is not in the Belief set. The defect of a 
 	Conjunction is the sum of the defects of its conditions, and the defect of a
-	Disjunction is the minimum of the defects of its conditions.
+	Disjunction is the minimum of the defects of its conditions. The defect of
+	a Ground Condition is the number of Beliefs differing from its closest
+	alternative.
 	"""
-	if isinstance(goal, Belief):
-		return 0 if find_matches(goal, beliefs, negation=negation) else 1
+	if isinstance(goal, GroundCondition):
+		return goal.defect(beliefs)
+
+	elif isinstance(goal, Belief):
+		return 0 if next(iter_matches(goal, beliefs, negation=negation), None) is not None else 1
 	
 	elif ((isinstance(goal, And) and not negation) or 
 	      (isinstance(goal, Or)  and     negation)):
@@ -186,41 +1329,351 @@ def defect(goal, beliefs, negation=False):
 		return defect(goal.cond, beliefs, negation=not negation)
 
 
-def expand(beliefs, actions):
+def expand(beliefs, actions, stats=None):
 	"""Apply each Action with all possible matches on the given Belief and
-	return the results as a List of Tuples (action, match, new_beliefs).
+	return the results as a List of Tuples (action, match, new_beliefs). If
+	the beliefs are a ground state, the actions have to be Ground Operators.
+	If Search Stats are given, the time spent for matching and updating and
+	the number of successors per Action are recorded there.
 	"""
+	if isinstance(beliefs, int):
+		start = stats.clock() if stats else 0
+		result = expand_ground(beliefs, actions)
+		if stats:
+			stats.add_time("match", start)
+			for (op, match, new_state) in result:
+				stats.generation(op.action)
+		return result
 	result = []
 	for action in actions:
-		for match in find_matches(action.pre, beliefs):
+		start = stats.clock() if stats else 0
+		matches = compile_condition(action.pre)(beliefs)
+		if stats:
+			start = stats.add_time("match", start)
+		for match in matches:
 			new_beliefs = update(beliefs, action.eff, match)
 			result += [ (action, match, new_beliefs) ]
+		if stats:
+			stats.add_time("update", start)
+			stats.generation(action, len(matches))
 	return result
 	
 
-def check_visited(beliefs, visited, length=0):
-	"""Check whether the Belief state has already be visited using the map of
-	visited Belief states to required plan lengths. Return True, if the given
-	Belief state has _not_ already been visited.
+def satisfied(goal, beliefs, stats=None):
+	"""Check whether the goal Condition is fulfilled for the Beliefs, which may
+	also be a Ground Condition and a ground state. If Search Stats are given,
+	the time spent for the test is recorded there.
 	"""
-	h = hash(frozenset(beliefs))
-	if h not in visited or visited[h] > length:
-		visited[h] = length
+	start = stats.clock() if stats else 0
+	if isinstance(goal, GroundCondition):
+		result = goal.satisfied(beliefs)
+	else:
+		result = next(compile_condition(goal, lazy=True)(beliefs), None) is not None
+	if stats:
+		stats.add_time("goal", start)
+	return result
+
+
+def achieves(goal, beliefs, plan):
+	"""Check whether the plan, a sequence of Actions and matches, achieves the
+	goal when executed in the Beliefs, with the precondition of each Action
+	holding in the state it is applied to.
+	"""
+	for (action, match) in plan:
+		if not exists(substitute_variables(action.pre, match), beliefs):
+			return False
+		beliefs = successor(beliefs, action, match)
+	return exists(goal, beliefs)
+
+
+def successor(beliefs, action, match):
+	"""Get the Beliefs resulting from applying the Action with the match, which
+	may also be a Ground Operator applied to a ground state.
+	"""
+	if isinstance(action, GroundOperator):
+		return action.apply(beliefs)
+	return update(beliefs, action.eff, match)
+
+
+class SearchNode:
+	"""Search Node class.
+
+	A node of the search tree, holding a Belief state (or ground state), the
+	action and match leading to it, and its parent node. Instead of copying
+	the plan for each new node, the plan is reconstructed by following the
+	parent pointers once a goal has been found. Thus, the searches drop the
+	state of a node once it has been expanded, so that only the states of the
+	nodes still to be expanded are kept in memory.
+	"""
+
+	__slots__ = ("state", "action", "match", "parent", "depth")
+
+	def __init__(self, state, action=None, match=None, parent=None):
+		self.state = state
+		self.action = action
+		self.match = match
+		self.parent = parent
+		self.depth = parent.depth + 1 if parent is not None else 0
+
+	def plan(self):
+		"""Get the plan leading to this node, as a list of (action, match)."""
+		plan = []
+		node = self
+		while node.parent is not None:
+			plan.append((node.action, node.match))
+			node = node.parent
+		plan.reverse()
+		return plan
+
+
+def check_visited(beliefs, visited, length=0, stats=None, key=None):
+	"""Check whether the Belief state has already be visited using the Visited
+	Store of visited Belief states and required plan lengths. Return True, if
+	the given Belief state has _not_ already been visited. If Search Stats are
+	given, the time spent for the check and pruned branches are recorded there.
+	The key of the state may be given instead of the state, see VisitedStore.
+	"""
+	start = stats.clock() if stats else 0
+	new = visited.check(beliefs, length, key)
+	if stats:
+		stats.add_time("visited", start)
+		if not new:
+			stats.pruned += 1
+	return new
+
+
+def state_key(beliefs, ids=None):
+	"""Get a tuple of hash and exact key for the Belief state. For a Belief
+	Base, those are its Zobrist hash and its bitmask of Belief ids; a ground
+	state is its own key. Other collections of Beliefs are converted first,
+	using the given Belief Ids, which have to be the same for all those states.
+	"""
+	if isinstance(beliefs, int):
+		return (hash(beliefs), beliefs)
+	if not isinstance(beliefs, BeliefBase):
+		beliefs = BeliefBase(beliefs, ids)
+	return (beliefs.zobrist, beliefs.mask)
+
+
+class VisitedStore:
+	"""Visited Store class.
+
+	Keeps track of visited Belief states and the lengths of the plans needed
+	to get there. States are stored exactly, but compactly, using their keys
+	as given by state_key (integers), filed under their hashes. If different
+	states have the same hash, the collision is counted, and the colliding
+	state is stored by its exact key only.
+
+	If a Symmetry is given, states are stored using their canonical keys
+	instead, so that permutations of visited states count as visited, too.
+	Belief states that are not Belief Bases are converted using the given
+	Belief Ids, or else Belief Ids of the Visited Store's own.
+	"""
+
+	def __init__(self, symmetry=None, ids=None):
+		self.symmetry = symmetry
+		self.ids = ids if ids is not None else BeliefIds()
+		self.states = {}
+		self.overflow = {}
+		self.collisions = 0
+
+	def __len__(self):
+		return len(self.states) + len(self.overflow)
+
+	def check(self, beliefs, length=0, key=None):
+		"""Check whether the Belief state has not yet been visited with a plan
+		of the given or smaller length, and if so, store it with that length.
+		Unless a Symmetry is used, the key of the state as given by state_key
+		(with the same Belief Ids) may be given instead of the state.
+		"""
+		if self.symmetry:
+			(h, key) = self.symmetry.key(beliefs)
+		elif key is not None:
+			(h, key) = key
+		else:
+			(h, key) = state_key(beliefs, self.ids)
+		entry = self.states.get(h)
+		if entry is None:
+			self.states[h] = (key, length)
+			return True
+		if entry[0] == key:
+			if entry[1] > length:
+				self.states[h] = (key, length)
+				return True
+			return False
+		# hash collision; tell states apart by their keys
+		if key not in self.overflow:
+			self.collisions += 1
+		elif self.overflow[key] <= length:
+			return False
+		self.overflow[key] = length
 		return True
-	global p; p += 1
-	return False
-	# For testing: Much slower, but guaranteed to be correct.
-#	if any((len(v) == len(beliefs) and
-#	        all(b in v for b in beliefs) and
-#	        visited[v] <= length) for v in visited):
-#		global p; p += 1
-#		return False
-#	visited[frozenset(beliefs)] = length
-#	return True
+
+	def stats(self):
+		"""Get statistics about the visited states: the number of states, of
+		hash collisions, and the (approximate) memory used, in bytes.
+		"""
+		memory = sys.getsizeof(self.states) + sys.getsizeof(self.overflow)
+		memory += sum(sys.getsizeof(e) + sys.getsizeof(e[0]) for e in self.states.values())
+		memory += sum(sys.getsizeof(k) for k in self.overflow)
+		return {"states": len(self), "collisions": self.collisions, "memory": memory}
 		
 
-def log(n, message):
-	"""Print log message, if LOG_LEVEL is >= n."""
+class SearchStats:
+	"""Search Stats class.
+
+	Collects statistics of a search: the number of expanded nodes (planning
+	steps), of generated successors, and of pruned branches, the largest size
+	of the fringe, the number of successors generated per Action (by name), and,
+	if timing is set, the time spent in matching, updating, goal tests, and
+	visited checks, in seconds.
+
+	If a callback is given, it is called with the Search Stats after every
+	interval expansions, e.g. for printing the progress of a long search.
+	The same Search Stats can be passed to several searches, accumulating the
+	statistics of all of them.
+	"""
+
+	PHASES = ("match", "update", "goal", "visited")
+
+	def __init__(self, timing=True, callback=None, interval=1000):
+		self.timing = timing
+		self.callback = callback
+		self.interval = interval
+		self.expanded = 0
+		self.generated = 0
+		self.pruned = 0
+		self.max_fringe = 0
+		self.actions = {}
+		self.times = dict((phase, 0.0) for phase in self.PHASES)
+		self.started = time.time()
+
+	def __repr__(self):
+		return ("SearchStats(expanded=%d, generated=%d, pruned=%d, max_fringe=%d)"
+		        % (self.expanded, self.generated, self.pruned, self.max_fringe))
+
+	def clock(self):
+		"""Get the current time for add_time, if timing is set, or else 0."""
+		return time.time() if self.timing else 0
+
+	def add_time(self, phase, start):
+		"""Add the time passed since start to the phase and return the current
+		time, so the next phase can be measured starting from there.
+		"""
+		if self.timing:
+			now = time.time()
+			self.times[phase] += now - start
+			return now
+		return 0
+
+	def expansion(self, fringe_size):
+		"""Record the expansion of a node, with the given size of the fringe,
+		calling the callback after each interval expansions.
+		"""
+		self.expanded += 1
+		if fringe_size > self.max_fringe:
+			self.max_fringe = fringe_size
+		if self.callback is not None and self.expanded % self.interval == 0:
+			self.callback(self)
+
+	def generation(self, action, count=1):
+		"""Record the generation of a number of successors by the Action."""
+		self.generated += count
+		if count:
+			self.actions[action.name] = self.actions.get(action.name, 0) + count
+
+	def as_dict(self):
+		"""Get the statistics as a dictionary, e.g. for writing them to a file."""
+		return {"expanded": self.expanded, "generated": self.generated,
+		        "pruned": self.pruned, "max_fringe": self.max_fringe,
+		        "actions": dict(self.actions), "times": dict(self.times),
+		        "elapsed": time.time() - self.started}
+
+
+class TableEntry:
+	"""Transposition Table Entry class.
+
+	The entry for a Belief state: the lower bound for the length of the plan
+	from there, and its cached expansion, if any, as actions, matches and keys
+	of the successor states.
+	"""
+
+	__slots__ = ("h", "successors")
+
+	def __init__(self, h):
+		self.h = h
+		self.successors = None
+
+
+class TranspositionTable:
+	"""Transposition Table class.
+
+	Holds Table Entries for Belief states across the iterations of Iterative
+	Deepening Search, using the keys given by state_key. The table holds at most
+	the given number of entries; if it is full, the least recently used entry is
+	evicted, losing its cached expansion and its lower bound.
+	"""
+
+	def __init__(self, size=None):
+		self.size = size or TABLE_SIZE
+		self.entries = OrderedDict()
+		self.ids = BeliefIds()
+		self.evictions = 0
+
+	def __len__(self):
+		return len(self.entries)
+
+	def key(self, beliefs):
+		"""Get the key of the Belief state used in the table."""
+		return state_key(beliefs, self.ids)
+
+	def get(self, key):
+		"""Get the entry for the key of a Belief state, if there is one."""
+		entry = self.entries.get(key)
+		if entry is not None:
+			self.entries.move_to_end(key)
+		return entry
+
+	def lookup(self, beliefs, goal, heuristic, key=None):
+		"""Get the entry for the Belief state, creating it if needed, using the
+		heuristic for the goal as initial lower bound. The key of the state may
+		be given, if known already.
+		"""
+		if key is None:
+			key = self.key(beliefs)
+		entry = self.get(key)
+		if entry is None:
+			entry = self.entries[key] = TableEntry(heuristic(goal, beliefs))
+			if len(self.entries) > self.size:
+				self.entries.popitem(last=False)
+				self.evictions += 1
+		return entry
+
+	def stats(self):
+		"""Get statistics about the table: the number of entries and evictions,
+		and the number of cached successors.
+		"""
+		successors = sum(len(e.successors) for e in self.entries.values() if e.successors)
+		return {"states": len(self), "evictions": self.evictions, "successors": successors}
+
+
+def log(n, message, *args):
+	"""Print log message, if LOG_LEVEL is >= n. The message is formatted with
+	the arguments, if any, only if it is actually printed.
+	"""
 	if LOG_LEVEL >= n:
-		print(message)
+		print(message % args if args else message)
+
+
+def log_visited(visited):
+	"""Print statistics of the Visited Store or Transposition Table, if
+	LOG_LEVEL is >= 3.
+	"""
+	if LOG_LEVEL >= 3:
+		if isinstance(visited, TranspositionTable):
+			log(3, " %(states)d table entries, %(evictions)d evictions, "
+			       "%(successors)d cached successors" % visited.stats())
+		else:
+			log(3, " %(states)d visited states, %(collisions)d hash collisions, "
+			       "%(memory)d bytes" % visited.stats())
 
@@ -5,7 +5,9 @@ This module contains a number of reasoning concepts, such as matching a given
 formula to the belief base, or updating the beliefs according to some rules.
 """
 
-from knowledge import Belief, And, Or, Not, Rule
+import weakref
+
+from knowledge import Belief, BeliefBase, And, Or, Not, Rule
 
 
 ################################################################################
@@ -26,6 +28,9 @@ def find_matches(condition, beliefs, matches=[{}], negation=False):
 	  variables to values is returned.
 	"""
 	if isinstance(condition, Belief):
+		if negation and len(matches) > 1 and not isinstance(beliefs, BeliefBase):
+			# filter all matches at once, instead of scanning beliefs for each
+			return list(anti_join(condition, beliefs, matches))
 		result = []
 		# for each given match...
 		for match in matches:
@@ -34,11 +39,11 @@ def find_matches(condition, beliefs, matches=[{}], negation=False):
 			if negation:
 				# allow only matches which do not contain the fact
 				# FIXME this way, a negation can only remove matches
-				if not any( do_match(belief, b) for b in beliefs):
+				if not any( do_match(belief, b) for b in candidates(belief, beliefs)):
 					result += [match]
 			else:
 				# for all matching beliefs
-				for other in [ b for b in beliefs if do_match(belief, b)]:
+				for other in [ b for b in candidates(belief, beliefs) if do_match(belief, b)]:
 					# assign variables, and add match to results
 					# skip if the value is already bound to another variable
 					m = match.copy()
@@ -75,6 +80,356 @@ def find_matches(condition, beliefs, matches=[{}], negation=False):
 
 
 
+def iter_matches(condition, beliefs, matches=({},), negation=False):
+	"""Generate the matches for this condition for the given beliefs one after
+	another, in the same order as find_matches would return them, but without
+	building the lists of matches for each part of the condition first. This
+	way, the caller can stop as soon as it has found the matches it needs.
+	Matches is an iterable of known partial matches.
+	"""
+	if isinstance(condition, Belief):
+		if negation and not isinstance(beliefs, BeliefBase):
+			for match in anti_join(condition, beliefs, matches):
+				yield match
+			return
+		for match in matches:
+			belief = substitute_variables(condition, match)
+			if negation:
+				if not any( do_match(belief, b) for b in candidates(belief, beliefs)):
+					yield match
+			else:
+				for other in [ b for b in candidates(belief, beliefs) if do_match(belief, b)]:
+					m = match.copy()
+					if var(belief.subj, False):
+						if other.subj in m.values(): continue
+						m[belief.subj] = other.subj
+					if var(belief.obj, False):
+						if other.obj in m.values(): continue
+						m[belief.obj] = other.obj
+					yield m
+
+	elif ((isinstance(condition, And) and not negation) or
+	      (isinstance(condition, Or)  and     negation)):
+		# chain generators, so that each match is passed on right away
+		for cond in condition.conditions:
+			matches = iter_matches(cond, beliefs, matches, negation)
+		for match in matches:
+			yield match
+
+	elif ((isinstance(condition, And) and     negation) or
+	      (isinstance(condition, Or)  and not negation)):
+		# each condition needs all the given matches; skip matches already
+		# generated for one of the former conditions, just like find_matches
+		matches = list(matches)
+		seen = []
+		for cond in condition.conditions:
+			new_matches = []
+			for m in iter_matches(cond, beliefs, matches, negation):
+				if m not in seen:
+					new_matches.append(m)
+					yield m
+			seen += new_matches
+
+	elif isinstance(condition, Not):
+		for match in iter_matches(condition.cond, beliefs, matches, not negation):
+			yield match
+
+
+def first_match(condition, beliefs):
+	"""Get the first match for this condition for the given beliefs, as
+	find_matches would return it, or None if there is no match at all.
+	"""
+	return next(iter_matches(condition, beliefs), None)
+
+
+def exists(condition, beliefs):
+	"""Check whether there is any match for this condition for the beliefs."""
+	return first_match(condition, beliefs) is not None
+
+
+def anti_join(condition, beliefs, matches):
+	"""Generate those of the matches for which the negated Belief condition
+	holds, i.e. for which the condition, with the variables substituted, does
+	not match any of the beliefs, just like find_matches does. Instead of
+	scanning the beliefs for each match, the beliefs with the condition's
+	predicate are hashed on their subjects and objects once, for each
+	combination of bound subject and object found among the matches, so that
+	each match is checked with a single lookup. Matches with values that can
+	not be hashed are checked by scanning the beliefs.
+	"""
+	tables = {}
+	for match in matches:
+		belief = substitute_variables(condition, match)
+		bound = (not var(belief.subj), not var(belief.obj))
+		if bound not in tables:
+			try:
+				tables[bound] = set((b.subj if bound[0] else None, b.obj if bound[1] else None)
+				                    for b in beliefs if b.pred == condition.pred)
+			except TypeError:
+				tables[bound] = None
+		key = (belief.subj if bound[0] else None, belief.obj if bound[1] else None)
+		try:
+			found = tables[bound] is not None and key in tables[bound]
+		except TypeError:
+			found = None
+		if found is None or tables[bound] is None:
+			found = any( do_match(belief, b) for b in beliefs )
+		if not found:
+			yield match
+
+
+
+################################################################################
+#                                                                              #
+#   COMPILED MATCHING                                                          #
+#                                                                              #
+################################################################################
+
+UNBOUND = object()
+
+_compiled = {}
+
+def compile_condition(condition, lazy=False):
+	"""Compile the condition to a matcher function, which, given a list or a
+	Belief Base of beliefs, returns the same list of matches as find_matches
+	would. Each variable of the condition is assigned a fixed slot, so that
+	partial matches are just tuples of the variables' values (or UNBOUND),
+	and the condition is translated once into nested generators, one for each
+	Belief, Conjunction, Disjunction and Negation. Matchers are cached as long
+	as the condition exists, so compiling the same condition again is cheap.
+
+	If lazy is set, the matcher returns an iterator of the matches instead,
+	just like iter_matches, so that e.g. a goal test can stop at the first.
+
+	Other than find_matches, the matchers assume that the values assigned to
+	the variables can not be mistaken for variables themselves.
+	"""
+	key = id(condition)
+	if key in _compiled and _compiled[key][0]() is condition:
+		return _compiled[key][2 if lazy else 1]
+
+	# assign slots to variables in the order find_matches would bind them,
+	# followed by those that are never bound, e.g. in negated Beliefs
+	order = []
+	def collect(cond, negation):
+		if isinstance(cond, Belief):
+			for term in (cond.subj, cond.obj):
+				if var(term, False) and term not in order and negation is not True:
+					order.append(term)
+		elif isinstance(cond, And) or isinstance(cond, Or):
+			for c in cond.conditions:
+				collect(c, negation)
+		elif isinstance(cond, Not):
+			collect(cond.cond, None if negation is None else not negation)
+	collect(condition, False)
+	collect(condition, None)
+	slots = dict((name, i) for (i, name) in enumerate(order))
+
+	match_all = _compile(condition, slots, False)
+	start = [ (UNBOUND,) * len(order) ]
+
+	def iter_matcher(beliefs):
+		for m in match_all(beliefs, start):
+			yield dict((name, m[i]) for (i, name) in enumerate(order) if m[i] is not UNBOUND)
+
+	def matcher(beliefs):
+		return list(iter_matcher(beliefs))
+
+	# hold the condition only weakly, and drop the matchers along with it
+	_compiled[key] = (weakref.ref(condition), matcher, iter_matcher)
+	weakref.finalize(condition, _compiled.pop, key, None)
+	return iter_matcher if lazy else matcher
+
+
+def _compile(condition, slots, negation):
+	"""Compile the condition to a generator function of beliefs and an iterable
+	of partial matches, i.e. tuples of slot values, generating the extended
+	partial matches, just like iter_matches does.
+	"""
+	if isinstance(condition, Belief):
+		return _compile_belief(condition, slots, negation)
+
+	elif ((isinstance(condition, And) and not negation) or
+	      (isinstance(condition, Or)  and     negation)):
+		parts = [ _compile(cond, slots, negation) for cond in condition.conditions ]
+		def match_sequence(beliefs, matches):
+			for part in parts:
+				matches = part(beliefs, matches)
+			return matches
+		return match_sequence
+
+	elif ((isinstance(condition, And) and     negation) or
+	      (isinstance(condition, Or)  and not negation)):
+		parts = [ _compile(cond, slots, negation) for cond in condition.conditions ]
+		def match_union(beliefs, matches):
+			matches = list(matches)
+			seen = set()
+			for part in parts:
+				new_matches = []
+				for m in part(beliefs, matches):
+					if m not in seen:
+						new_matches.append(m)
+						yield m
+				seen.update(new_matches)
+		return match_union
+
+	elif isinstance(condition, Not):
+		return _compile(condition.cond, slots, not negation)
+
+
+def _compile_belief(belief, slots, negation):
+	"""Compile the Belief pattern to a matching function; see _compile. For
+	both subject and object, the pattern holds either a variable's slot, or a
+	constant value, or a wildcard.
+	"""
+	(pred, subj, obj) = (belief.pred, belief.subj, belief.obj)
+	s_slot = slots.get(subj) if var(subj, False) else None
+	o_slot = slots.get(obj)  if var(obj,  False) else None
+	s_const = not var(subj)
+	o_const = not var(obj)
+
+	def match_belief(beliefs, matches):
+		indexed = isinstance(beliefs, BeliefBase)
+		for m in matches:
+			# get values and whether they are bound
+			if s_slot is None:
+				s_val, s_bound = subj, s_const
+			else:
+				s_val = m[s_slot]
+				s_bound = s_val is not UNBOUND
+			if o_slot is None:
+				o_val, o_bound = obj, o_const
+			else:
+				o_val = m[o_slot]
+				o_bound = o_val is not UNBOUND
+			others = beliefs.lookup(pred, s_val, o_val, s_bound, o_bound) if indexed else beliefs
+
+			if negation:
+				# allow only matches which do not contain the fact
+				if not any( b.pred == pred and (not s_bound or s_val == b.subj)
+				                           and (not o_bound or o_val == b.obj)
+				            for b in others ):
+					yield m
+			else:
+				for b in others:
+					if (b.pred != pred or (s_bound and s_val != b.subj)
+					                   or (o_bound and o_val != b.obj)):
+						continue
+					# assign variables, skip if value is already bound
+					n = m
+					if s_slot is not None and not s_bound:
+						if b.subj in n: continue
+						n = n[:s_slot] + (b.subj,) + n[s_slot+1:]
+					if o_slot is not None and not o_bound:
+						if b.obj in n: continue
+						n = n[:o_slot] + (b.obj,) + n[o_slot+1:]
+					yield n
+	return match_belief
+
+
+
+################################################################################
+#                                                                              #
+#   QUERY PLANNING                                                             #
+#                                                                              #
+################################################################################
+
+def cardinalities(beliefs):
+	"""Get statistics about the predicates in the beliefs, as a dictionary
+	mapping each predicate to the number of beliefs with that predicate and the
+	numbers of distinct subjects and objects of those beliefs.
+	"""
+	counts, subjects, objects = {}, {}, {}
+	for belief in beliefs:
+		counts[belief.pred] = counts.get(belief.pred, 0) + 1
+		subjects.setdefault(belief.pred, set()).add(belief.subj)
+		objects.setdefault(belief.pred, set()).add(belief.obj)
+	return dict((pred, (counts[pred], len(subjects[pred]), len(objects[pred])))
+	            for pred in counts)
+
+
+def estimate(belief, bound, stats):
+	"""Estimate the number of beliefs matching the Belief pattern, given the set
+	of variables already bound and the predicate statistics, assuming that
+	subjects and objects are distributed uniformly.
+	"""
+	(count, subjects, objects) = stats.get(belief.pred, (0, 1, 1))
+	if not var(belief.subj) or belief.subj in bound:
+		count /= float(subjects)
+	if not var(belief.obj) or belief.obj in bound:
+		count /= float(objects)
+	return count
+
+
+def reorder_conjunction(condition, beliefs, stats=None):
+	"""Reorder the terms of the Conjunction, such that positive Beliefs with few
+	estimated matches come first, and Negations are checked as soon as possible,
+	yielding the same matches as the original condition (but maybe in another
+	order). As Negations in find_matches treat unbound variables as wildcards,
+	each Negation is kept after those terms binding its variables, and before
+	those terms that would bind variables it treats as wildcards. Disjunctions,
+	Negations of Negations (which may bind variables), and Beliefs using the
+	same variable twice are kept in place, and only the terms between them are
+	reordered.
+	"""
+	if not isinstance(condition, And):
+		return condition
+	stats = stats or cardinalities(beliefs)
+	result, segment, bound = [], [], set()
+	for cond in condition.conditions + (None,):
+		if ((isinstance(cond, Not) and all(neg for (pred, neg) in predicates(cond))) or
+		    (isinstance(cond, Belief) and not (var(cond.subj, False) and cond.subj == cond.obj))):
+			segment.append(cond)
+		else:
+			result += _reorder_segment(segment, bound, stats)
+			if cond is not None:
+				result.append(cond)
+			segment = []
+	return And(*result)
+
+
+def _reorder_segment(segment, bound, stats):
+	"""Reorder a segment of Beliefs and Negations of a Conjunction; see
+	reorder_conjunction. The set of variables bound before the segment is
+	updated with those bound by the segment's Beliefs.
+	"""
+	def variables(cond):
+		if isinstance(cond, Not):
+			return variables(cond.cond)
+		if isinstance(cond, Belief):
+			return set(t for t in (cond.subj, cond.obj) if var(t, False))
+		if isinstance(cond, And) or isinstance(cond, Or):
+			return set().union(*(variables(c) for c in cond.conditions))
+
+	# each Negation has to stay on the same side of terms sharing free variables
+	before = [ set() for cond in segment ]
+	for i, cond in enumerate(segment):
+		if isinstance(cond, Not):
+			free = variables(cond) - bound
+			for j, other in enumerate(segment):
+				if isinstance(other, Belief) and free & variables(other):
+					if j < i:
+						before[i].add(j)
+					else:
+						before[j].add(i)
+
+	# place Negations as early as possible, and else the most selective Belief
+	result, placed = [], set()
+	while len(placed) < len(segment):
+		available = [ i for i in range(len(segment))
+		              if i not in placed and before[i] <= placed ]
+		negations = [ i for i in available if isinstance(segment[i], Not) ]
+		if negations:
+			i = negations[0]
+		else:
+			i = min(available, key=lambda i: estimate(segment[i], bound, stats))
+			bound |= variables(segment[i])
+		placed.add(i)
+		result.append(segment[i])
+	return result
+
+
+
 ################################################################################
 #                                                                              #
 #   BELIEF REVISION                                                            #
@@ -89,8 +444,20 @@ def update(beliefs, condition, match={}, negation=False):
 	"""
 	if match:
 		condition = substitute_variables(condition, match)
-	if isinstance(condition, Belief):
+	if isinstance(beliefs, BeliefBase):
+		beliefs = beliefs.copy()
+	else:
 		beliefs = list(beliefs)
+	update_in_place(beliefs, condition, negation)
+	return beliefs
+
+
+def update_in_place(beliefs, condition, negation=False):
+	"""Update the beliefs by adding and removing beliefs according to the given
+	condition, like update, but alter the given list or Belief Base directly
+	instead of creating a copy. Variables have to be substituted beforehand.
+	"""
+	if isinstance(condition, Belief):
 		if condition in beliefs and negation:
 			# remove condition from beliefs
 			# XXX if there are variables in the Belief, remove all matches?
@@ -98,41 +465,180 @@ def update(beliefs, condition, match={}, negation=False):
 		elif condition not in beliefs and not negation:
 			# add condition to beliefs
 			# XXX what to do if there are still variables in the condition?
-			beliefs.append(condition)
-		return beliefs
+			if isinstance(beliefs, BeliefBase):
+				beliefs.add(condition)
+			else:
+				beliefs.append(condition)
 		
 	elif isinstance(condition, And) or isinstance(condition, Or):
 		# update both condition
 		# XXX for OR and NAND, updating one of the condition would be enough
-		updated = beliefs
 		for cond in condition.conditions:
-			updated = update(updated, cond, {}, negation)
-		return updated
+			update_in_place(beliefs, cond, negation)
 		
 	elif isinstance(condition, Not):
 		# update condition with negation
-		return update(beliefs, condition.cond, {}, not negation)
+		update_in_place(beliefs, condition.cond, not negation)
 
 
-def deduce(beliefs, *rules):
+def deduce(beliefs, *rules, semi_naive=False):
 	"""Apply the given Rules to the Beliefs by finding matches for their
 	preconditions and updating the beliefs according to the preconditions with
 	the matches. The deduction will be repeated until no new facts could be
 	deduced. Like update, this method will not alter the original list of
-	beliefs but create an updated copy instead.
+	beliefs but create an updated copy instead. If semi_naive is set, the
+	deduction is done using semi_naive_deduce.
+
+	The Rules are still applied in passes, in their original order, but using
+	the Rules' dependency graph, a Rule is applied again only if one of the
+	Rules it depends on has changed the beliefs since it was last applied, as
+	otherwise applying it could not change anything.
 	"""
-	beliefs = list(beliefs)
-	has_new_beliefs = True
-	while has_new_beliefs:
-		has_new_beliefs = False
-		for rule in rules:
+	if semi_naive:
+		return semi_naive_deduce(beliefs, *rules)
+	beliefs = BeliefBase(beliefs)
+	graph = dependencies(rules)
+	pending = set(range(len(rules)))
+	while pending:
+		for (i, rule) in enumerate(rules):
+			if i not in pending:
+				continue
+			pending.discard(i)
 			# for each match, update beliefs with effect
+			has_new_beliefs = False
 			matches = find_matches(rule.pre, beliefs)
 			for match in matches:
 				new_beliefs = update(beliefs, rule.eff, match)
 				has_new_beliefs |= beliefs != new_beliefs
 				beliefs = new_beliefs
-	return beliefs
+			if has_new_beliefs:
+				pending |= graph[i]
+	return list(beliefs)
+
+
+def semi_naive_deduce(beliefs, *rules):
+	"""Semi-Naive Deduction. The Rules are split up into strata, such that the
+	predicates a Rule's precondition negates are fully deduced in lower strata.
+	Within a stratum, the Rules are first applied to all Beliefs, and in each
+	following round only those matches are looked for that involve at least one
+	Belief that has been deduced in the round before (the delta), until no more
+	Beliefs are deduced. Rules not using any of the predicates of the delta
+	are skipped. Falls back to plain deduction if some of the Rules' effects
+	remove Beliefs or if the Rules can not be stratified.
+	"""
+	strata = stratify(rules)
+	if strata is None or any(split_effects(rule.eff)[1] for rule in rules):
+		return deduce(beliefs, *rules)
+	beliefs = BeliefBase(beliefs)
+	for stratum in strata:
+		reads = [ set(pred for (pred, negated) in predicates(rule.pre)) for rule in stratum ]
+		heads = set(b.pred for rule in stratum for b in split_effects(rule.eff)[0])
+		delta = None
+		while delta is None or delta:
+			new_beliefs = BeliefBase(ids=beliefs.ids)
+			changed = set(belief.pred for belief in delta) if delta is not None else None
+			for (rule, used) in zip(stratum, reads):
+				if changed is not None and not used & changed:
+					continue
+				if delta is None or not incremental(rule.pre, heads):
+					matches = find_matches(rule.pre, beliefs)
+				else:
+					matches = delta_matches(rule.pre, beliefs, delta)
+				for match in matches:
+					for belief in split_effects(rule.eff, match)[0]:
+						if belief not in beliefs:
+							new_beliefs.add(belief)
+			for belief in new_beliefs:
+				beliefs.add(belief)
+			delta = new_beliefs
+	return list(beliefs)
+
+
+def delta_matches(condition, beliefs, delta):
+	"""Find matches for the condition that use at least one of the Beliefs in
+	delta, which have to be contained in the beliefs, too. For each positive
+	term of the (conjunctive) condition, that term is matched against the delta
+	and all other terms against all beliefs, keeping the order of the terms.
+	The same match may be found more than once.
+	"""
+	conditions = condition.conditions if isinstance(condition, And) else (condition,)
+	results = []
+	prefix = [{}]
+	for i, cond in enumerate(conditions):
+		if not isinstance(cond, Not):
+			matches = find_matches(cond, delta, prefix)
+			for other in conditions[i+1:]:
+				matches = find_matches(other, beliefs, matches)
+			results += matches
+		prefix = find_matches(cond, beliefs, prefix)
+		if not prefix:
+			break
+	return results
+
+
+def incremental(condition, heads=()):
+	"""Check whether matches for the condition can be found incrementally using
+	delta_matches, i.e. whether the condition is a Belief or a Conjunction of
+	negations and of Beliefs or Disjunctions of Beliefs. As delta_matches does
+	not match negations against the delta, negations must not use any of the
+	given predicates, e.g. those deduced in the current stratum, positively,
+	as in a double negation.
+	"""
+	def atomic(cond):
+		return (isinstance(cond, Belief) or
+		        (isinstance(cond, Or) and all(atomic(c) for c in cond.conditions)))
+	def fixed(cond):
+		return not any(pred in heads and not negated for (pred, negated) in predicates(cond))
+	conditions = condition.conditions if isinstance(condition, And) else (condition,)
+	return all(atomic(cond) or (isinstance(cond, Not) and fixed(cond))
+	           for cond in conditions)
+
+
+def dependencies(rules):
+	"""Build the predicate-level dependency graph of the Rules, as a list
+	holding for each Rule the set of indices of the Rules depending on it,
+	i.e. the Rules that have to be applied again once that Rule has changed
+	the beliefs: those whose preconditions use one of the predicates it adds
+	or removes, and those whose effects it may undo, as it removes predicates
+	they add, or adds predicates they remove.
+	"""
+	reads, adds, removes = [], [], []
+	for rule in rules:
+		reads.append(set(pred for (pred, negated) in predicates(rule.pre)))
+		(added, removed) = split_effects(rule.eff)
+		adds.append(set(belief.pred for belief in added))
+		removes.append(set(belief.pred for belief in removed))
+	graph = []
+	for i in range(len(rules)):
+		changed = adds[i] | removes[i]
+		graph.append(set(j for j in range(len(rules))
+		                 if reads[j] & changed or adds[j] & removes[i]
+		                                       or removes[j] & adds[i]))
+	return graph
+
+
+def stratify(rules):
+	"""Split the Rules up into a list of strata (lists of Rules), such that
+	each Rule comes after all the Rules that produce predicates its precondition
+	negates, and not before the Rules that produce predicates it requires. The
+	original order of the Rules is kept within each stratum. Returns None if
+	there is no such stratification, i.e. if there is a cycle through negation.
+	"""
+	heads = [set(b.pred for b in split_effects(rule.eff)[0]) for rule in rules]
+	strata = [0] * len(rules)
+	changed = True
+	while changed:
+		changed = False
+		for i, rule in enumerate(rules):
+			for (pred, negated) in predicates(rule.pre):
+				for j, head in enumerate(heads):
+					if pred in head and strata[i] < strata[j] + negated:
+						strata[i] = strata[j] + negated
+						changed = True
+			if strata[i] > len(rules):
+				return None
+	return [ [rule for i, rule in enumerate(rules) if strata[i] == n]
+	         for n in sorted(set(strata)) ]
 
 
 
@@ -180,6 +686,51 @@ def do_match(belief_1, belief_2):
 	           (var(belief_1.obj ) or belief_1.obj  == belief_2.obj) ) )
 
 
+def candidates(belief, beliefs):
+	"""Get the beliefs that could match the given belief. If the beliefs are a
+	Belief Base, the bound parts of the belief are used for looking up the
+	candidates in the Belief Base's indices; otherwise, all beliefs are
+	candidates. In both cases, the candidates still have to be checked with
+	do_match, e.g. for the predicate when no index could be used.
+	"""
+	if isinstance(beliefs, BeliefBase):
+		return beliefs.lookup(belief.pred, belief.subj, belief.obj,
+		                      not var(belief.subj), not var(belief.obj))
+	return beliefs
+
+
+def predicates(condition, negation=False):
+	"""Get the predicates used in the condition, as a set of tuples of the
+	predicate and whether the predicate is negated in the condition.
+	"""
+	if isinstance(condition, Belief):
+		return set([(condition.pred, negation)])
+	if isinstance(condition, And) or isinstance(condition, Or):
+		return set().union(*(predicates(cond, negation) for cond in condition.conditions))
+	if isinstance(condition, Not):
+		return predicates(condition.cond, not negation)
+
+
+def split_effects(condition, match={}, negation=False):
+	"""Split the effect condition up into the lists of Beliefs it adds and the
+	Beliefs it removes when used for updating the beliefs. If a match is given,
+	variables in the condition are substituted accordingly.
+	"""
+	if match:
+		condition = substitute_variables(condition, match)
+	if isinstance(condition, Belief):
+		return ([], [condition]) if negation else ([condition], [])
+	if isinstance(condition, And) or isinstance(condition, Or):
+		adds, removes = [], []
+		for cond in condition.conditions:
+			a, r = split_effects(cond, {}, negation)
+			adds += a
+			removes += r
+		return adds, removes
+	if isinstance(condition, Not):
+		return split_effects(condition.cond, {}, not negation)
+
+
 def substitute_variables(condition, match):
 	"""Substitute Variables in given belief according to match. The condition is
 	not altered; instead a copy with the variables being replaces is created.
@@ -188,6 +739,8 @@ def substitute_variables(condition, match):
 		subj, obj = condition.subj, condition.obj
 		subj = match[subj] if var(subj) and subj in match else subj
 		obj  = match[obj]  if var(obj)  and obj  in match else obj
+		if subj is condition.subj and obj is condition.obj:
+			return condition
 		return Belief(condition.pred, subj, obj)
 		
 	if isinstance(condition, And) or isinstance(condition, Or):
@@ -85,9 +85,11 @@ disconnect = Action("Disconnect",
 
 actions = [turn_on, turn_off, lock, unlock, insert, remove, connect, disconnect]
 
-if __name__ == "__main__":
-	from test import *
-
+def create_problem():
+	"""Create the initial Beliefs, with a powered Machine and a broken Board in
+	its locked Socket, and the goal of the Machine being powered with a working
+	Board. Returns the Beliefs and the goal.
+	"""
 	# abbreviations for objects
 	M, S, B1, B2, C1, C2, C3, C4 = "Machine Socket Board1 Board2 Cable1 Cable2 Cable3 Cable4".split()
 	C11, C12, C13, C14, C21, C22, C23, C24 = ("Connector%d%d" % (i,j) for i in [1,2] for j in [1,2,3,4])
@@ -106,13 +108,30 @@ if __name__ == "__main__":
 		# ~ has_connector(B2, C21), has_connector(B2, C22), has_connector(B2, C23), has_connector(B2, C24), 
 		# ~ has_cable(C11, C1), has_cable(C12, C1), has_cable(C13, C1), has_cable(C14, C1)
 	)
+	return (beliefs, And(powered(M), has_board(_, x), Not(broken(x))))
+
+if __name__ == "__main__":
+	from test import *
+
+	# create initial beliefs
+	(beliefs, goal) = create_problem()
 	print_all("Initial Beliefs", beliefs)
 
 	beliefs2 = deduce(beliefs, *rules)
 	print_all("Deduced Beliefs", [b for b in beliefs2 if b not in beliefs])
+	test_deduce(beliefs, rules, beliefs2)
+
+	# all matchers must give the same matches as find_matches, also for a
+	# machine with cables and connectors, and with no socket locked
+	wired = [ b for b in beliefs2 if b.pred != "locked" ] + [
+		Cable("Cable1"), Cable("Cable2"), Connector("Connector11"), Connector("Connector12"),
+		Connector("Connector21"), has_connector("Board1", "Connector11"),
+		has_connector("Board1", "Connector12"), has_connector("Board2", "Connector21"),
+		has_cable("Connector11", "Cable1") ]
+	for condition in [ rule.pre for rule in rules + actions ]:
+		test_matchers(condition, beliefs2)
+		test_matchers(condition, wired)
 
-	goal = And(powered(M), has_board(_, x), Not(broken(x)))
-	
 	plan = search_plan(goal, beliefs, actions, False, True)
 	if plan != None:
 		print_all("Plan sequence for goal %s" % goal, [ (a.name, m) for (a, m) in plan])
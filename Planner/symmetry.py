@@ -0,0 +1,132 @@
+"""Symmetry.
+
+This module contains the detection of symmetric objects in a planning problem
+and the canonicalization of states with respect to those symmetries.
+
+Objects (or other values) that are mentioned neither in the goal nor in any of
+the Actions can be permuted without changing the problem: Actions only refer
+to them through variables, so if a plan leads from one state to the goal,
+the same plan with the objects permuted leads from the permuted state to the
+goal, too. Thus, when searching, a state can be skipped if a permutation of it
+has already been visited with a plan of the same or smaller length.
+
+To detect this, each state is brought to a canonical form, in which the
+symmetric objects are replaced by placeholders, numbered in the order of the
+objects' signatures, i.e. the predicates and positions of the Beliefs they
+appear in, and the values they are related to. If all the symmetric objects
+of a state have different signatures, all the permutations of that state have
+the same canonical form; objects with equal signatures are ordered arbitrarily,
+so some symmetric states may be missed, but states that are not symmetric are
+never considered equal.
+"""
+
+from knowledge import *
+from reasoning import *
+
+
+class Symmetry:
+	"""Symmetry class.
+
+	Holds the symmetric objects of a planning problem, determined from the
+	initial Beliefs, the goal and the Actions, and provides the canonical keys
+	of states to be used for checking visited states instead of state_key. If
+	a Ground Task is given, the canonical keys can also be computed for ground
+	states of that task.
+	"""
+
+	def __init__(self, goal, beliefs, actions, task=None):
+		constants = set()
+		for condition in [goal] + [ c for a in actions for c in (a.pre, a.eff) ]:
+			constants |= set(terms(condition))
+		values = set()
+		for belief in beliefs:
+			values.update((belief.subj, belief.obj))
+		self.free = set(v for v in values if v is not None and v not in constants)
+		self.codes = {}
+		self.ids = BeliefIds()
+		self.task = None
+		if task is not None:
+			self.ground(task)
+
+	def __len__(self):
+		return len(self.free)
+
+	def ground(self, task):
+		"""Prepare the canonicalization of ground states of the Ground Task by
+		determining the bits of all Beliefs involving symmetric objects.
+		"""
+		self.task = task
+		self.free_bits = 0
+		for (i, belief) in enumerate(task.atoms):
+			if belief.subj in self.free or belief.obj in self.free:
+				self.free_bits |= 1 << i
+
+	def code(self, value):
+		"""Get a number for the value, used for ordering the signatures."""
+		if value not in self.codes:
+			self.codes[value] = len(self.codes)
+		return self.codes[value]
+
+	def key(self, beliefs):
+		"""Get a tuple of hash and key for the Belief state, just like state_key,
+		but the same for all states that are permutations of each other with
+		respect to the symmetric objects, as far as those are detected.
+		"""
+		if isinstance(beliefs, int):
+			symmetric = beliefs & self.free_bits
+			fixed = beliefs & ~self.free_bits
+			involved = self.task.decode(symmetric)
+		else:
+			if not isinstance(beliefs, BeliefBase):
+				beliefs = BeliefBase(beliefs, self.ids)
+			involved = set()
+			for index in (beliefs.by_subj, beliefs.by_obj):
+				for part in index.values():
+					for value in self.free:
+						if value in part:
+							involved.update(part[value])
+			fixed = beliefs.mask
+			for belief in involved:
+				fixed &= ~(1 << beliefs.ids[belief][0])
+		key = (fixed, self.canonical(involved))
+		return (hash(key), key)
+
+	def canonical(self, involved):
+		"""Get the canonical form of the Beliefs involving symmetric objects, as
+		a frozenset of tuples of predicate, subject and object, with the symmetric
+		objects replaced by placeholders.
+		"""
+		signatures = {}
+		for belief in involved:
+			for (position, value, other) in ((0, belief.subj, belief.obj),
+			                                 (1, belief.obj, belief.subj)):
+				if value in self.free:
+					code = -1 if other in self.free else self.code(other)
+					signatures.setdefault(value, []).append((belief.pred, position, code))
+		order = sorted(signatures, key=lambda v: (sorted(signatures[v]), self.code(v)))
+		labels = dict((value, placeholder(i)) for (i, value) in enumerate(order))
+		return frozenset((b.pred, labels.get(b.subj, b.subj), labels.get(b.obj, b.obj))
+		                 for b in involved)
+
+
+_placeholders = []
+
+def placeholder(i):
+	"""Get the i-th placeholder for symmetric objects, a unique object."""
+	while len(_placeholders) <= i:
+		_placeholders.append(object())
+	return _placeholders[i]
+
+
+def terms(condition):
+	"""Get the terms of the condition that are neither variables nor wildcards,
+	i.e. the constants mentioned in it.
+	"""
+	if isinstance(condition, Belief):
+		return [ t for t in (condition.subj, condition.obj)
+		         if t is not None and not var(t) ]
+	if isinstance(condition, And) or isinstance(condition, Or):
+		return [ t for cond in condition.conditions for t in terms(cond) ]
+	if isinstance(condition, Not):
+		return terms(condition.cond)
+	return []
@@ -19,6 +19,40 @@ def test(condition, beliefs, expected=None):
 		assert matches == expected
 
 
+def test_deduce(beliefs, rules, expected=None):
+	"""Deduce beliefs with and without semi-naive deduction, check that the
+	results are the same, and compare to expected, if given.
+	"""
+	naive = deduce(beliefs, *rules)
+	semi_naive = deduce(beliefs, *rules, semi_naive=True)
+	print("Deduced %d Beliefs, naive and semi-naive" % len(naive))
+	assert set(naive) == set(semi_naive)
+	if expected:
+		assert set(expected) <= set(naive)
+	return naive
+
+
+def test_matchers(condition, beliefs):
+	"""Find matches for condition with each of the matchers, i.e. the compiled
+	and the lazy matchers, with and without a Belief Base (and thus anti-joins
+	for negated Beliefs), and with the conjunction reordered, and check that
+	they give the same matches as find_matches (in any order, if reordered).
+	"""
+	matches = find_matches(condition, beliefs)
+	base = BeliefBase(beliefs)
+	for b in (beliefs, base):
+		assert find_matches(condition, b) == matches
+		assert list(iter_matches(condition, b)) == matches
+		assert compile_condition(condition)(b) == matches
+		assert list(compile_condition(condition, lazy=True)(b)) == matches
+	key = lambda match: sorted(map(repr, match.items()))
+	reordered = reorder_conjunction(condition, beliefs)
+	assert sorted(map(key, find_matches(reordered, beliefs))) == sorted(map(key, matches))
+	assert sorted(map(key, compile_condition(reordered)(base))) == sorted(map(key, matches))
+	print("Found %d Matches for %s with all matchers" % (len(matches), condition))
+	return matches
+
+
 def print_all(title, collection):
 	"""Print all elements of collection together with a title.
 	"""
@@ -27,18 +61,19 @@ def print_all(title, collection):
 		print("   " + str(item))
 	
 
-def reason_plan_execute(objects, rules, goal, actions, serial_decomp=False, breadth_first=True):
+def reason_plan_execute(objects, rules, goal, actions, serial_decomp=False, breadth_first=True, **options):
 	"""Do a full Reason-Plan-Execute cycle on the given objects, trying to
 	fulfill the given goal. First, a number of Beliefs are created from the
 	given Objects. Then, further Beliefs are inferred using the given rules, if
 	any. Then, a plan sequence is searched for, fulfilling the goal. If a plan
 	sequence has been found, the plans elements (tuples of actions and matches)
 	are executed on the original Objects, altering them in the process.
+	Further options, such as the search strategy, are passed to search_plan.
 	"""
 	beliefs = create_beliefs(*objects)
 	if rules:
 		beliefs = deduce(beliefs, *rules)
-	plan = search_plan(goal, beliefs, actions, serial_decomp, breadth_first)
+	plan = search_plan(goal, beliefs, actions, serial_decomp, breadth_first, **options)
 
 	if plan != None:
 		print_all("Plan sequence for goal %s" % goal, [ (a.name, m) for (a, m) in plan])
@@ -48,7 +83,7 @@ def reason_plan_execute(objects, rules, goal, actions, serial_decomp=False, brea
 		print_all("After Plan Execution", [vars(x) for x in  objects])
 		
 		# test goal
-		beliefs = create_beliefs(*objects)
+		beliefs = create_belief_base(*objects)
 		if rules:
 			beliefs = deduce(beliefs, *rules)
 		assert find_matches(goal, beliefs) != []